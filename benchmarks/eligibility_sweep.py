@@ -0,0 +1,211 @@
+"""
+Сравнение выбора пользователей для checkRating: поштучный обход объектов
+против векторного расчета по колоночной таблице UserColumns.
+
+Векторный вариант живет только здесь: при загрузке базы NoFapDB планирует
+очередь обычным циклом по _plan_due, выигрыш NumPy на одном проходе при
+старте не окупает лишней зависимости.
+
+Запуск из корня проекта:
+    poetry run python -m benchmarks.eligibility_sweep --users 1000000
+"""
+
+import random
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from src.database.due_queue import to_seconds
+from src.database.meme_catalog import meme_catalog
+from src.database.user_stat import UserStat
+
+SECONDS_IN_DAY = 24 * 60 * 60
+
+FLAG_BLOCKED = 1
+FLAG_WINNER = 2
+
+# last_meme_day для пользователя без мемов
+NO_MEME = -1
+
+
+class UserColumns:
+    """
+    Колоночная копия таблицы пользователей в массивах NumPy.
+
+    Хранит только то, что нужно для выбора пользователей в checkRating:
+    lastTimeFap в секундах, день последнего мема и флаги isBlocked/isWinner.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self.uids = np.zeros(0, dtype=np.int64)
+        self.last_time_fap = np.zeros(0, dtype=np.float64)
+        self.last_meme_day = np.zeros(0, dtype=np.int32)
+        self.flags = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def build(self, users: Iterable[Tuple[UserStat, Optional[int]]]):
+        """Заполняет таблицу парами (пользователь, день последнего мема)."""
+        pairs = list(users)
+        size = len(pairs)
+        # Каждая колонка заполняется одним проходом fromiter, без списка строк
+        self.uids = np.fromiter((user.uid for user, _ in pairs), np.int64, size)
+        self.last_time_fap = np.fromiter(
+            (to_seconds(user.lastTimeFap) for user, _ in pairs), np.float64, size
+        )
+        self.last_meme_day = np.fromiter(
+            (NO_MEME if day is None else day for _, day in pairs), np.int32, size
+        )
+        self.flags = np.fromiter(
+            (self._flags_of(user) for user, _ in pairs), np.uint8, size
+        )
+        self._size = size
+
+    @staticmethod
+    def _flags_of(user: UserStat) -> int:
+        return (FLAG_BLOCKED if user.isBlocked else 0) | (
+            FLAG_WINNER if user.isWinner else 0
+        )
+
+    def plan(self, now: datetime, meme_days: np.ndarray):
+        """
+        Векторный аналог NoFapDB._plan_due для всех пользователей сразу.
+
+        Args:
+            now: Текущее время
+            meme_days: Булев массив, meme_days[day] - есть ли мемы этого дня
+
+        Returns:
+            (uids, due в секундах, next_day, маска запаркованных, маска активных)
+        """
+        size = self._size
+        uids = self.uids[:size]
+        last_time = self.last_time_fap[:size]
+        last_day = self.last_meme_day[:size].astype(np.int64)
+        flags = self.flags[:size]
+
+        days = np.floor((to_seconds(now) - last_time) / SECONDS_IN_DAY).astype(np.int64)
+        no_memes = last_day == NO_MEME
+        # Был сброс после последнего мема - мем текущего дня серии положен сразу
+        restart = ~no_memes & (days < last_day)
+        next_day = np.where(
+            no_memes, 0, np.where(restart, np.maximum(days, 0), last_day + 1)
+        )
+        due = np.where(
+            no_memes | restart, last_time, last_time + next_day * SECONDS_IN_DAY
+        )
+
+        has_memes = np.zeros(size, dtype=bool)
+        known = next_day < len(meme_days)
+        has_memes[known] = meme_days[next_day[known]]
+
+        blocked = (flags & FLAG_BLOCKED) != 0
+        waiting = ~blocked & ((flags & FLAG_WINNER) != 0) & ~has_memes
+        # После сброса нужный день растет каждые сутки - такие победители
+        # проверяются на следующей границе дня, паркуются только остальные
+        due = np.where(waiting & restart, last_time + (days + 1) * SECONDS_IN_DAY, due)
+        parked = waiting & ~restart
+        active = ~blocked & ~parked
+        return uids, due, next_day, parked, active
+
+
+def eligible_uids(columns: UserColumns, now: datetime, mask: np.ndarray) -> np.ndarray:
+    """uid всех пользователей, которых пора обработать в checkRating к now."""
+    uids, due, _, _, active = columns.plan(now, mask)
+    return uids[active & (due <= to_seconds(now))]
+
+
+def make_users(users_count: int, max_day: int) -> dict:
+    random.seed(42)
+    now = datetime.now()
+    users = dict()
+    for uid in range(users_count):
+        days = random.randint(0, max_day)
+        last_time_fap = now - timedelta(days=days, seconds=random.randint(0, 86399))
+        if random.random() < 0.05:
+            # Без мемов: только начал челлендж
+            memes = ()
+        elif random.random() < 0.05:
+            # Сброс: последний мем старше текущей серии
+            memes = (f"day {days + random.randint(1, 5)}_1.jpg",)
+        else:
+            # Мем сегодняшнего или вчерашнего дня
+            memes = (f"day {max(days - random.randint(0, 1), 0)}_1.jpg",)
+        users[uid] = UserStat(
+            uid,
+            f"user_{uid}",
+            last_time_fap,
+            memes,
+            random.random() < 0.01,
+            random.random() < 0.02,
+        )
+    return users
+
+
+def legacy_eligible(users: dict, now: datetime, meme_days: set) -> list:
+    """Проверка из process_single_user до ожидания API, по одному пользователю."""
+    eligible = list()
+    for user in users.values():
+        days = (now - user.lastTimeFap).days
+        if days < 0 or user.isBlocked:
+            continue
+        new_day = 0
+        if user.memeIds:
+            last_day = meme_catalog.day_of_id(user.memeIds[-1]) or 0
+            new_day = min(last_day + 1, days)
+            if last_day == new_day:
+                continue
+        if new_day in meme_days or not user.isWinner:
+            eligible.append(user.uid)
+    return eligible
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = ArgumentParser(description="checkRating eligibility benchmark")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--max-day", type=int, default=90)
+    parser.add_argument("--meme-days", type=int, default=60)
+    args = parser.parse_args()
+
+    users = make_users(args.users, args.max_day)
+    meme_days = set(range(args.meme_days))
+    mask = np.zeros(args.meme_days, dtype=bool)
+    mask[sorted(meme_days)] = True
+    now = datetime.now()
+
+    columns = UserColumns()
+    _, build_time = timed(
+        lambda: columns.build(
+            (
+                user,
+                meme_catalog.day_of_id(user.memeIds[-1]) if user.memeIds else None,
+            )
+            for user in users.values()
+        )
+    )
+    legacy, legacy_time = timed(lambda: legacy_eligible(users, now, meme_days))
+    vectorized, vectorized_time = timed(lambda: eligible_uids(columns, now, mask))
+
+    assert set(legacy) == set(vectorized.tolist()), "selections differ"
+
+    print(f"Users:              {args.users}")
+    print(f"Eligible:           {len(vectorized)}")
+    print(f"Columns build:      {build_time * 1000:8.1f} ms (once)")
+    print(f"Per-object sweep:   {legacy_time * 1000:8.1f} ms")
+    print(f"Vectorized sweep:   {vectorized_time * 1000:8.1f} ms")
+    print(f"Speedup:            {legacy_time / vectorized_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
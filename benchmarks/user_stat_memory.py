@@ -0,0 +1,96 @@
+"""
+Сравнение памяти, занимаемой пользователями в старом и компактном формате.
+
+Запуск из корня проекта (рядом с папкой storage):
+    poetry run python -m benchmarks.user_stat_memory --users 100000
+"""
+
+import gc
+import json
+import random
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from src.database.user_stat import UserStat
+
+
+@dataclass
+class LegacyUserStat:
+    """Формат записи пользователя до перехода на __slots__ и id мемов."""
+
+    uid: int
+    username: str
+    lastTimeFap: datetime
+    collectedMemes: list
+    isBlocked: bool
+    isWinner: bool
+
+
+def make_raw_users(users_count: int, max_day: int = 90) -> dict:
+    """Генерирует JSON документ базы и разбирает его, как это делает json.load."""
+    random.seed(42)
+    now = datetime.now()
+    data = dict()
+    for uid in range(users_count):
+        days = random.randint(0, max_day)
+        data[str(uid)] = {
+            "uid": uid,
+            "username": f"user_{uid}",
+            "lastTimeFap": (now - timedelta(days=days)).isoformat(),
+            "collectedMemes": [
+                f"day {day}_{random.randint(1, 3)}.jpg" for day in range(days)
+            ],
+            "isBlocked": False,
+            "isWinner": False,
+        }
+    return json.loads(json.dumps(data))
+
+
+def measure(build) -> int:
+    """Память в байтах, которую удерживает результат build()."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return used
+
+
+def build_users(cls, raw_users: dict) -> dict:
+    return {
+        int(uid): cls(
+            user["uid"],
+            user["username"],
+            datetime.fromisoformat(user["lastTimeFap"]),
+            user["collectedMemes"],
+            user["isBlocked"],
+            user["isWinner"],
+        )
+        for uid, user in raw_users.items()
+    }
+
+
+def main():
+    parser = ArgumentParser(description="UserStat memory benchmark")
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # Строки берем из отдельного разбора JSON на каждый замер, чтобы
+    # старый формат удерживал свои копии имен мемов, как после json.load
+    legacy = measure(lambda: build_users(LegacyUserStat, make_raw_users(args.users)))
+    compact = measure(lambda: build_users(UserStat, make_raw_users(args.users)))
+
+    print(f"Users: {args.users}")
+    print(f"Legacy dataclass: {legacy / 2**20:8.1f} MiB")
+    print(f"Compact UserStat: {compact / 2**20:8.1f} MiB")
+    print(
+        f"Saved:            {(legacy - compact) / 2**20:8.1f} MiB ({1 - compact / legacy:.0%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Отправка записанных обновлений в бота, запущенного в webhook режиме, как это
+делает Telegram. Печатает статус, время ответа и ответ, пришедший прямо в
+HTTP ответе (если обработчик ответил inline).
+
+Запуск из корня проекта (бот уже запущен с --mode webhook):
+    poetry run python -m benchmarks.webhook_replay --updates benchmarks/webhook_updates.json
+"""
+
+import asyncio
+import json
+import time
+from argparse import ArgumentParser
+
+import aiohttp
+
+from config.config import WEBAPP_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+from src.utils.webhook import SECRET_TOKEN_HEADER
+
+
+async def replay(url: str, updates: list, secret: str, repeat: int) -> list:
+    headers = {SECRET_TOKEN_HEADER: secret}
+    timings = []
+    async with aiohttp.ClientSession() as session:
+        for round_number in range(repeat):
+            for update in updates:
+                update = dict(update)
+                # Уникальный update_id на каждый повтор, как у настоящих обновлений
+                update["update_id"] += round_number * len(updates)
+                started = time.perf_counter()
+                async with session.post(url, json=update, headers=headers) as resp:
+                    body = await resp.text()
+                elapsed = time.perf_counter() - started
+                timings.append(elapsed)
+                if round_number == 0:
+                    print(
+                        f"[{resp.status}] {elapsed * 1000:7.1f} ms "
+                        f"update {update['update_id']}: {body or '<empty>'}"
+                    )
+    return timings
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--updates", default="benchmarks/webhook_updates.json")
+    parser.add_argument(
+        "--url", default=f"http://127.0.0.1:{WEBAPP_PORT}{WEBHOOK_PATH}"
+    )
+    parser.add_argument("--secret", default=WEBHOOK_SECRET_TOKEN)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.updates, "r") as f:
+        updates = json.load(f)
+
+    timings = asyncio.run(replay(args.url, updates, args.secret, args.repeat))
+    timings.sort()
+    print(f"Requests:           {len(timings)}")
+    print(f"Median:             {timings[len(timings) // 2] * 1000:8.1f} ms")
+    print(f"Max:                {timings[-1] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,15 @@ BOT_TOKEN = getenv("BOT_TOKEN", None)
 USE_LOCAL_SERVER = getenv("USE_LOCAL_SERVER", "false").lower() == "true"
 LOCAL_SERVER_URL = getenv("LOCAL_SERVER_URL", "http://localhost:8081")
 
+# Webhook режим (python no_fap.py --mode webhook)
+# Публичный URL, который регистрируется в Telegram; пусто - webhook уже
+# настроен снаружи. Бот рассчитан на один инстанс и в этом режиме
+WEBHOOK_URL = getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET_TOKEN = getenv("WEBHOOK_SECRET_TOKEN", "")
+WEBAPP_HOST = getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(getenv("WEBAPP_PORT", "8080"))
+
 # S3 Configuration for database backups
 S3_ENABLED = getenv("S3_ENABLED", "false").lower() == "true"
 S3_BUCKET_NAME = getenv("S3_BUCKET_NAME", "")
@@ -24,3 +33,67 @@ ADMINS = (
     if admins_str
     else set()
 )
+
+# Database storage configuration
+DB_JOURNAL_ENABLED = getenv("DB_JOURNAL_ENABLED", "false").lower() == "true"
+DB_JOURNAL_COMPACT_MINUTES = int(getenv("DB_JOURNAL_COMPACT_MINUTES", "10"))
+# json | journal | sqlite
+DB_BACKEND = getenv("DB_BACKEND", "journal" if DB_JOURNAL_ENABLED else "json").lower()
+# Не чаще одного сохранения базы за интервал (секунды)
+DB_FLUSH_INTERVAL_SECONDS = float(getenv("DB_FLUSH_INTERVAL_SECONDS", "5"))
+# Полный снапшот вместо дельты, если изменилась большая доля пользователей
+DB_DELTA_MAX_RATIO = float(getenv("DB_DELTA_MAX_RATIO", "0.25"))
+# ... или в файле дельты накопилось слишком много записей
+DB_DELTA_MAX_RECORDS = int(getenv("DB_DELTA_MAX_RECORDS", "5000"))
+DB_SQLITE_PATH = getenv("DB_SQLITE_PATH", "storage/all_scores_saved.sqlite3")
+
+# Служебный чат для предзагрузки мемов в Telegram (пусто - прогрев выключен)
+meme_warmup_chat_str = getenv("MEME_WARMUP_CHAT_ID", "").strip()
+MEME_WARMUP_CHAT_ID = int(meme_warmup_chat_str) if meme_warmup_chat_str else None
+MEME_WARMUP_DELAY_SECONDS = float(getenv("MEME_WARMUP_DELAY_SECONDS", "3"))
+# Как часто проверять папку мемов на изменения (по mtime папки)
+MEMES_RELOAD_SECONDS = int(getenv("MEMES_RELOAD_SECONDS", "60"))
+
+# Кэш bot.get_chat: никнеймы достаточно обновлять раз в несколько часов
+CHAT_CACHE_TTL_SECONDS = float(getenv("CHAT_CACHE_TTL_SECONDS", str(3 * 60 * 60)))
+CHAT_CACHE_MAX_SIZE = int(getenv("CHAT_CACHE_MAX_SIZE", "50000"))
+# Активный get_chat только для тех, от кого не было обновлений дольше окна
+USERNAME_SILENCE_WINDOW_SECONDS = float(
+    getenv("USERNAME_SILENCE_WINDOW_SECONDS", str(24 * 60 * 60))
+)
+
+# Лимиты исходящих сообщений Telegram
+RATE_LIMIT_GLOBAL_PER_SECOND = float(getenv("RATE_LIMIT_GLOBAL_PER_SECOND", "30"))
+RATE_LIMIT_PER_CHAT_PER_SECOND = float(getenv("RATE_LIMIT_PER_CHAT_PER_SECOND", "1"))
+RATE_LIMIT_PER_CHAT_BURST = float(getenv("RATE_LIMIT_PER_CHAT_BURST", "3"))
+RATE_LIMIT_GROUP_PER_MINUTE = float(getenv("RATE_LIMIT_GROUP_PER_MINUTE", "20"))
+# Сколько раз повторять запрос после RetryAfter, прежде чем отдать ошибку
+RATE_LIMIT_MAX_RETRIES = int(getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+
+# Одновременные запросы к API (checkRating и рассылки): лимит подстраивается
+# между MIN и MAX, пока ответы быстрее целевой задержки
+CONCURRENCY_INITIAL = int(getenv("CONCURRENCY_INITIAL", "10"))
+CONCURRENCY_MIN = int(getenv("CONCURRENCY_MIN", "2"))
+CONCURRENCY_MAX = int(getenv("CONCURRENCY_MAX", "100"))
+CONCURRENCY_TARGET_LATENCY_SECONDS = float(
+    getenv("CONCURRENCY_TARGET_LATENCY_SECONDS", "1.5")
+)
+# Сколько секунд один проход checkRating набирает новых пользователей (тик - 60 с)
+CHECK_RATING_TIME_BUDGET_SECONDS = float(
+    getenv("CHECK_RATING_TIME_BUDGET_SECONDS", "50")
+)
+# Сколько ждать обработки одного пользователя в checkRating, прежде чем бросить
+CHECK_RATING_USER_TIMEOUT_SECONDS = float(
+    getenv("CHECK_RATING_USER_TIMEOUT_SECONDS", "120")
+)
+
+# Рассылки (outbox в storage/outbox)
+BROADCAST_MAX_ATTEMPTS = int(getenv("BROADCAST_MAX_ATTEMPTS", "5"))
+# Пауза перед первым повтором, дальше удваивается
+BROADCAST_RETRY_DELAY_SECONDS = float(getenv("BROADCAST_RETRY_DELAY_SECONDS", "30"))
+BROADCAST_CHECKPOINT_SECONDS = float(getenv("BROADCAST_CHECKPOINT_SECONDS", "2"))
+
+# Повторы для пользователей, обращения к которым падают (экспоненциально)
+FAILURE_RETRY_BASE_SECONDS = float(getenv("FAILURE_RETRY_BASE_SECONDS", "300"))
+FAILURE_RETRY_MAX_SECONDS = float(getenv("FAILURE_RETRY_MAX_SECONDS", str(6 * 60 * 60)))
+FAILURE_REGISTRY_MAX_SIZE = int(getenv("FAILURE_REGISTRY_MAX_SIZE", "10000"))
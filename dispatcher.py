@@ -1,26 +1,70 @@
 import logging
 
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 from aiogram.bot.api import TelegramAPIServer
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 
-from config.config import BOT_TOKEN, LOCAL_SERVER_URL, USE_LOCAL_SERVER
+from config.config import (
+    BOT_TOKEN,
+    CONCURRENCY_INITIAL,
+    CONCURRENCY_MAX,
+    CONCURRENCY_MIN,
+    CONCURRENCY_TARGET_LATENCY_SECONDS,
+    LOCAL_SERVER_URL,
+    RATE_LIMIT_GLOBAL_PER_SECOND,
+    RATE_LIMIT_GROUP_PER_MINUTE,
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_PER_CHAT_BURST,
+    RATE_LIMIT_PER_CHAT_PER_SECOND,
+    USE_LOCAL_SERVER,
+)
 from src.filters.admin import IsAdminFilter
 from src.middlewares.black_list import BlackListMiddleware
 from src.middlewares.logging import LoggingMiddleware
+from src.middlewares.username_tracking import UsernameTrackingMiddleware
+from src.utils.async_utils import AdaptiveConcurrencyLimiter
+from src.utils.rate_limiter import OutboundRateLimiter, RateLimitedBot
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+# Все исходящие сообщения идут через общий ограничитель
+rate_limiter = OutboundRateLimiter(
+    RATE_LIMIT_GLOBAL_PER_SECOND,
+    RATE_LIMIT_PER_CHAT_PER_SECOND,
+    RATE_LIMIT_PER_CHAT_BURST,
+    RATE_LIMIT_GROUP_PER_MINUTE,
+)
+
+# Сколько запросов к API держать в полете: подстраивается под ответы Telegram
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    CONCURRENCY_INITIAL,
+    CONCURRENCY_MIN,
+    CONCURRENCY_MAX,
+    CONCURRENCY_TARGET_LATENCY_SECONDS,
+)
+
 # Создаем бота в зависимости от настроек
 if USE_LOCAL_SERVER:
     print(f"🔧 Using local Telegram API server: {LOCAL_SERVER_URL}")
     local_server = TelegramAPIServer.from_base(LOCAL_SERVER_URL)
-    bot = Bot(token=BOT_TOKEN, server=local_server)
+    bot = RateLimitedBot(
+        token=BOT_TOKEN,
+        server=local_server,
+        limiter=rate_limiter,
+        max_retries=RATE_LIMIT_MAX_RETRIES,
+        concurrency=concurrency_limiter,
+    )
 else:
     print("🌐 Using official Telegram API")
-    bot = Bot(token=BOT_TOKEN)
+    bot = RateLimitedBot(
+        token=BOT_TOKEN,
+        limiter=rate_limiter,
+        max_retries=RATE_LIMIT_MAX_RETRIES,
+        concurrency=concurrency_limiter,
+    )
 dp = Dispatcher(bot, storage=MemoryStorage())
 dp.filters_factory.bind(IsAdminFilter)
 dp.middleware.setup(LoggingMiddleware())
+dp.middleware.setup(UsernameTrackingMiddleware())
 dp.middleware.setup(BlackListMiddleware())
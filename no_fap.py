@@ -2,30 +2,39 @@ from argparse import ArgumentParser
 from datetime import datetime
 
 from aiogram import types
+from aiogram.dispatcher.webhook import SendMessage
 from aiogram.utils import executor
 
 from commands import commands
+from config.config import WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_PATH
 from database import database
-from dispatcher import bot, dp
+from dispatcher import dp
 from logger import noFapLogger
 from sheduler import scheduler
 from src import handlers as handlers
 from src.keyboard import start_kb
+from src.utils.broadcast import broadcaster
+from src.utils.chat_cache import chat_cache
 from src.utils.log_sender import send_logs
+from src.utils.meme_warmup import start_meme_warmup
+from src.utils.webhook import SecretTokenRequestHandler, register_webhook
 
 
 @dp.message_handler(commands=[commands.HelpCommand])
 async def show_help(message: types.Message):
-    await message.reply(
-        f"Hi!\nI am No Fap Bot [created by @timtim2379]!\nOptions:{commands.getAllCommands()}"
-    )
+    # Ответ возвращается из обработчика: в webhook режиме он уходит прямо в
+    # HTTP ответе, при polling aiogram отправляет его сам
+    return SendMessage(
+        message.chat.id,
+        f"Hi!\nI am No Fap Bot [created by @timtim2379]!\nOptions:{commands.getAllCommands()}",
+    ).reply(message)
 
 
 @dp.message_handler(commands=[commands.StartCommand])
 async def send_welcome(message: types.Message):
     chatId = message.chat.id
     if chatId not in database:
-        chat = await bot.get_chat(chatId)
+        chat = await chat_cache.get(chatId)
         username = chat.username
         database.addNewUser(chatId, username, datetime.now())
 
@@ -39,18 +48,40 @@ async def send_welcome(message: types.Message):
 def parse_args():
     parser = ArgumentParser(prog=f"{__file__}")
     parser.add_argument("-l", "--logs_output", type=str)
+    parser.add_argument(
+        "-m", "--mode", choices=("polling", "webhook"), default="polling"
+    )
     args = parser.parse_args()
     loggingParam = args.logs_output
     if loggingParam and loggingParam.lower() == "true":
         noFapLogger.set_console_logging(True)
     else:
         noFapLogger.set_console_logging(False)
+    return args
 
 
 async def on_startup(dp):
     """Callback функция, вызываемая при запуске бота."""
     scheduler.start()
     noFapLogger.info("Scheduler started")
+    database.start_persistence()
+    start_meme_warmup(database.memes)
+    resumed = broadcaster.resume()
+    if resumed:
+        noFapLogger.info(f"Resumed {resumed} unfinished broadcasts")
+
+
+async def on_startup_webhook(dp):
+    await register_webhook(dp.bot)
+    await on_startup(dp)
+
+
+async def on_shutdown(dp):
+    """Callback функция, вызываемая при остановке бота."""
+    # Рассылки сохраняют прогресс и меняют статусы пользователей - до базы
+    await broadcaster.close()
+    await database.close()
+    noFapLogger.info("Database closed")
 
 
 def main():
@@ -59,8 +90,26 @@ def main():
     noFapLogger.setLoggerSender(send_logs)
     noFapLogger.info("✅ logsSender установлен успешно")
     noFapLogger.info("🤖 Запуск бота")
-    parse_args()
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+    args = parse_args()
+    if args.mode == "webhook":
+        noFapLogger.info(
+            f"🌐 Webhook mode on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}"
+        )
+        # Старые обновления сбрасывает setWebhook(drop_pending_updates),
+        # skip_updates здесь нельзя: getUpdates не работает при активном webhook
+        webhook_executor = executor.Executor(dp)
+        webhook_executor.on_startup(on_startup_webhook)
+        webhook_executor.on_shutdown(on_shutdown)
+        webhook_executor.start_webhook(
+            webhook_path=WEBHOOK_PATH,
+            request_handler=SecretTokenRequestHandler,
+            host=WEBAPP_HOST,
+            port=WEBAPP_PORT,
+        )
+    else:
+        executor.start_polling(
+            dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown
+        )
 
 
 if __name__ == "__main__":
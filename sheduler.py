@@ -1,27 +1,41 @@
+import asyncio
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
+from config.config import DB_JOURNAL_COMPACT_MINUTES, MEMES_RELOAD_SECONDS
 from database import database
 from logger import noFapLogger
-from src.handlers.daily_actions import (
-    checkRating,
-    clear_problematic_users_cache,
-    sendCheckMessageToWinners,
-)
+from src.handlers.daily_actions import checkRating, sendCheckMessageToWinners
+from src.handlers.meme_actions import reload_memes
 from src.utils.s3_backup import backup_all_to_s3
 
+
+async def backup_to_s3():
+    """
+    Бэкап БД и мемов в S3. В S3 уходит только JSON файл базы, поэтому сначала
+    в него сворачиваются изменения из дельты или журнала (или выгружается
+    SQLite база).
+    """
+    await database.prepareBackup()
+    await asyncio.get_running_loop().run_in_executor(None, backup_all_to_s3)
+
+
 scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
 
 logging_trigger = CronTrigger(hour="21", minute="00")
 winners_trigger = CronTrigger(hour="20", minute="00")
 check_rating_trigger = IntervalTrigger(seconds=60)
-cache_clear_trigger = CronTrigger(
-    hour="3", minute="00"
-)  # Очистка кэша каждый день в 3:00
 s3_backup_trigger = CronTrigger(
     hour="22", minute="00"
 )  # Полный бэкап (БД + мемы) в S3 каждый день в 22:00
+journal_compaction_trigger = IntervalTrigger(
+    minutes=DB_JOURNAL_COMPACT_MINUTES
+)  # Свёртка журнала/дельты изменений БД в снапшот
+memes_reload_trigger = IntervalTrigger(
+    seconds=MEMES_RELOAD_SECONDS
+)  # Проверка папки мемов на новые и удалённые файлы
 
 scheduler.add_job(
     noFapLogger.logDatabase,
@@ -30,6 +44,11 @@ scheduler.add_job(
     id="logging_job",
 )
 scheduler.add_job(sendCheckMessageToWinners, trigger=winners_trigger)
-scheduler.add_job(checkRating, trigger=check_rating_trigger)
-scheduler.add_job(clear_problematic_users_cache, trigger=cache_clear_trigger)
-scheduler.add_job(backup_all_to_s3, trigger=s3_backup_trigger)
+# Наложения отсекает и считает сам checkRating, поэтому планировщик пропускает
+# второй экземпляр до него; пропущенные тики не накапливаются (coalesce)
+scheduler.add_job(
+    checkRating, trigger=check_rating_trigger, max_instances=2, coalesce=True
+)
+scheduler.add_job(backup_to_s3, trigger=s3_backup_trigger)
+scheduler.add_job(database.compact, trigger=journal_compaction_trigger)
+scheduler.add_job(reload_memes, trigger=memes_reload_trigger)
@@ -1,65 +1,114 @@
-import json
+import asyncio
+import gc
 import os
-from datetime import datetime
-from typing import List, Optional, Tuple
-
-import dateutil.parser
-
-from src.utils.json_encoder import EnhancedJSONEncoder
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.config import (
+    DB_BACKEND,
+    DB_FLUSH_INTERVAL_SECONDS,
+    DB_SQLITE_PATH,
+    FAILURE_REGISTRY_MAX_SIZE,
+    FAILURE_RETRY_BASE_SECONDS,
+    FAILURE_RETRY_MAX_SECONDS,
+)
+from logger import noFapLogger
 from src.utils.s3_backup import restore_database_from_s3, restore_memes_from_s3
 
-from .states import UserContext
+from .due_queue import DueQueue, to_seconds
+from .failure_registry import FailureRegistry
+from .leaderboard import Leaderboard
+from .meme_catalog import meme_catalog
+from .persistence import FlushStats, WriteBehindPersister
+from .states import UserContexts
+from .storage import create_storage
 from .user_stat import UserStat
 
 
+def memes_manifest_path(memes_path: str) -> str:
+    """storage/memes -> storage/memes_manifest.json"""
+    return os.path.normpath(memes_path) + "_manifest.json"
+
+
 class NoFapDB:
     def __init__(
         self,
         init_file=os.path.join("storage", "all_scores_saved.json"),
         memes_path=os.path.join("storage", "memes"),
+        storage=None,
     ):
-        self.data = dict()
-        self.user_contexts = dict()
-        self.cached_memes = dict()
+        self.memes = meme_catalog
+        # username.lower() -> uid'ы в порядке присвоения ника (последний - актуальный)
+        self._uids_by_nick: Dict[str, Dict[int, None]] = dict()
+        # Живое множество заблокированных, меняется только при смене isBlocked
+        self._blocked_uids: Set[int] = set()
+        self.leaderboard = Leaderboard()
+        # Растет при каждом изменении, видимом в статистике
+        self.leaderboard_version = 0
+        # Когда каждого пользователя пора обработать в checkRating
+        self.due_queue = DueQueue()
         self.file_storage_path = init_file
+        if storage is None:
+            storage = create_storage(DB_BACKEND, init_file, DB_SQLITE_PATH)
+        self.storage = storage
+        # Запись в хранилище идет из рабочих потоков, но строго по одной
+        self._io_lock = threading.Lock()
+        # Пользователи, изменённые с последнего сохранения
+        self._dirty_uids: Set[int] = set()
+        # uid -> time.monotonic() последнего входящего обновления (не сохраняется)
+        self._last_seen: Dict[int, float] = dict()
+        self.flush_stats = FlushStats()
+        self.persister = WriteBehindPersister(
+            self._flush_in_background, DB_FLUSH_INTERVAL_SECONDS
+        )
+        # Пользователи, обращения к которым падали, и когда пробовать снова
+        self.failures = FailureRegistry(
+            os.path.join(os.path.dirname(init_file), "failed_users.json"),
+            FAILURE_RETRY_BASE_SECONDS,
+            FAILURE_RETRY_MAX_SECONDS,
+            FAILURE_REGISTRY_MAX_SIZE,
+        )
+        self.failures.load()
 
-        # Проверяем существование локального файла БД
-        if not os.path.exists(init_file):
+        # Проверяем существование локальной БД
+        if not self.storage.exists():
             # Пытаемся восстановить из S3
             self._try_restore_from_s3(init_file)
+            # Оставшиеся локальные дельты относятся к другому снапшоту
+            self.storage.discard_changes()
 
         # Проверяем существование папки с мемами
         if not os.path.exists(memes_path) or not os.listdir(memes_path):
             # Пытаемся восстановить мемы из S3
             self._try_restore_memes_from_s3(memes_path)
 
-        if os.path.exists(init_file):
-            with open(init_file, "r") as f:
-                data = json.load(f)
-                for uid in data.keys():
-                    user_data = data[uid]
-                    memes = user_data.get("collectedMemes", list())
-                    isBlocked = user_data.get("isBlocked", False)
-                    isWinner = user_data.get("isWinner", False)
-                    self.data[int(uid)] = UserStat(
-                        uid=user_data["uid"],
-                        username=user_data["username"],
-                        lastTimeFap=dateutil.parser.isoparse(user_data["lastTimeFap"]),
-                        collectedMemes=memes,
-                        isBlocked=isBlocked,
-                        isWinner=isWinner,
-                    )
-                    userContext = UserContext(int(uid))
-                    userContext.addRefreshCallback(callback=self.refresh_user)
-                    self.user_contexts[int(uid)] = userContext
-
-        if os.path.exists(memes_path):
-            for file_name in os.listdir(memes_path):
-                day_of_file = int(file_name.split()[1].split("_")[0])
-                if day_of_file not in self.cached_memes:
-                    self.cached_memes[day_of_file] = [file_name]
-                else:
-                    self.cached_memes[day_of_file].append(file_name)
+        # Каталог грузится до пользователей, чтобы id мемов совпадали с манифестом
+        self.memes.load(memes_path, memes_manifest_path(memes_path))
+
+        # Массовое создание объектов без пауз сборщика мусора на каждом поколении
+        gc.disable()
+        try:
+            self._load_users()
+        finally:
+            gc.enable()
+
+    def _load_users(self):
+        self.data = self.storage.load()
+        # Контексты создаются лениво при первом обращении к пользователю
+        self.user_contexts = UserContexts(self.data, self.refresh_user)
+        self._blocked_uids = set()
+        for uid, user in self.data.items():
+            self._index_nick(uid, user.username)
+            if user.isBlocked:
+                self._blocked_uids.add(uid)
+        self.leaderboard.build(
+            (user.lastTimeFap, uid)
+            for uid, user in self.data.items()
+            if self._is_on_leaderboard(user)
+        )
+        self._build_due_queue()
 
     def _try_restore_from_s3(self, database_path: str):
         """
@@ -93,8 +142,6 @@ class NoFapDB:
             memes_path: Путь к папке с мемами
         """
         try:
-            from logger import noFapLogger
-
             noFapLogger.info(f"🖼️ Memes folder is empty or missing: {memes_path}")
             noFapLogger.info("🔄 Attempting to restore memes from S3...")
 
@@ -119,8 +166,6 @@ class NoFapDB:
                 )
 
         except Exception as e:
-            from logger import noFapLogger
-
             noFapLogger.warning(f"⚠️ Failed to restore memes from S3: {e}")
             noFapLogger.info(
                 "🎭 Bot will continue without memes (they can be restored later)"
@@ -132,47 +177,87 @@ class NoFapDB:
     def getBlackList(self) -> List[UserStat]:
         """Возвращает список заблокированных пользователей с их ID и usernames"""
         banned_users = []
-        for uid, user_stat in self.data.items():
-            if user_stat.isBlocked:
-                banned_users.append(
-                    {"uid": uid, "username": user_stat.username or "NaN"}
-                )
+        for uid in sorted(self._blocked_uids):
+            user_stat = self.data[uid]
+            banned_users.append({"uid": uid, "username": user_stat.username or "NaN"})
         return banned_users
 
-    def getBlackListUIDs(self) -> set:
-        """Возвращает только UID'ы заблокированных пользователей (для обратной совместимости)"""
-        bannedUIDs = map(
-            lambda item: item[0],
-            filter(lambda uStat: uStat[1].isBlocked, self.data.items()),
-        )
-        return set(bannedUIDs)
+    def isUserBlocked(self, uid: int) -> bool:
+        return uid in self._blocked_uids
+
+    def getBlackListSize(self) -> int:
+        return len(self._blocked_uids)
 
     def __contains__(self, uid: int) -> bool:
         return uid in self.data
 
     def addNewUser(self, uid: int, username: str, lastTimeFap: datetime):
         self.data[uid] = UserStat(uid, username, lastTimeFap, list(), False, False)
-        userContext = UserContext(int(uid))
-        userContext.addRefreshCallback(callback=self.refresh_user)
-        self.user_contexts[int(uid)] = userContext
-        with open(self.file_storage_path, "w") as f:
-            json.dump(self.data, f, cls=EnhancedJSONEncoder, indent=4)
+        self._index_nick(uid, username)
+        self._refresh_leaderboard(self.data[uid])
+        self.storage.add_user(self.data[uid])
+        self._dirty_uids.add(uid)
+        self.rescheduleUser(uid)
+        self._request_flush()
 
     def getStatById(self, uid: int) -> UserStat:
         return self.data[uid]
 
     def refresh_user(self, uid: int):
-        self.data[uid].lastTimeFap = datetime.now()
+        self.update(uid, lastTimeFap=datetime.now())
+
+    def seenUser(self, uid: int, username: Optional[str]) -> bool:
+        """
+        Отмечает входящее обновление от пользователя и сверяет его ник.
+
+        Returns:
+            True, если ник изменился и был записан
+        """
+        user = self.data.get(uid)
+        if user is None:
+            return False
+        self._last_seen[uid] = time.monotonic()
+        # Пользователь пишет боту - чат точно жив
+        self.failures.forget(uid)
+        if not username or user.username == username:
+            return False
+        self.update(uid, newNickName=username)
+        return True
+
+    def isSilent(self, uid: int, window: float) -> bool:
+        """Пользователь не присылал обновлений дольше window секунд."""
+        seen = self._last_seen.get(uid)
+        return seen is None or time.monotonic() - seen > window
 
     def getUserIDFromNick(self, nickname: str) -> Optional[int]:
-        filtered = list(
-            filter(lambda uStat: uStat[1].username == nickname, self.data.items())
-        )
-        if len(filtered) == 0:
+        """
+        Ищет пользователя по нику без учета регистра.
+
+        Если ник числится за несколькими пользователями (кто-то сменил ник,
+        а обновление другого еще не пришло), возвращается тот, кому ник был
+        присвоен последним.
+        """
+        owners = self._uids_by_nick.get(nickname.lower())
+        if not owners:
             return None
-        firstFound = filtered[0]
-        uid = firstFound[0]
-        return uid
+        return next(reversed(owners))
+
+    def _index_nick(self, uid: int, username: Optional[str]):
+        if not username:
+            return
+        owners = self._uids_by_nick.setdefault(username.lower(), dict())
+        owners.pop(uid, None)
+        owners[uid] = None
+
+    def _unindex_nick(self, uid: int, username: Optional[str]):
+        if not username:
+            return
+        owners = self._uids_by_nick.get(username.lower())
+        if owners is None:
+            return
+        owners.pop(uid, None)
+        if not owners:
+            del self._uids_by_nick[username.lower()]
 
     def update(
         self,
@@ -181,38 +266,295 @@ class NoFapDB:
         newNickName=None,
         winnerFlag=None,
         bannedFlag=None,
+        collectedMeme=None,
     ):
         if lastTimeFap is not None:
-            self.data[uid].lastTimeFap = lastTimeFap
+            self._set_field(uid, "lastTimeFap", lastTimeFap)
             return
         if newNickName is not None:
-            self.data[uid].username = newNickName
+            self._set_field(uid, "username", newNickName)
             return
         if winnerFlag is not None:
-            self.data[uid].isWinner = winnerFlag
+            self._set_field(uid, "isWinner", winnerFlag)
             return
         if bannedFlag is not None:
-            self.data[uid].isBlocked = bannedFlag
+            self._set_field(uid, "isBlocked", bannedFlag)
+            return
+        if collectedMeme is not None:
+            index = self.data[uid].addMeme(collectedMeme)
+            self.storage.add_meme(uid, index, collectedMeme)
+            self._mark_dirty(uid)
+            self.rescheduleUser(uid)
+            return
+        self._request_flush()
+
+    def _set_field(self, uid: int, field: str, value):
+        user = self.data[uid]
+        old_value = getattr(user, field)
+        if old_value == value:
             return
-        with open(self.file_storage_path, "w") as f:
-            json.dump(self.data, f, cls=EnhancedJSONEncoder, indent=4)
+        setattr(user, field, value)
+        self.storage.set_field(uid, field, value)
+        self._mark_dirty(uid)
+        if field == "username":
+            self._unindex_nick(uid, old_value)
+            self._index_nick(uid, value)
+        elif field == "isBlocked":
+            if value:
+                self._blocked_uids.add(uid)
+            else:
+                self._blocked_uids.discard(uid)
+                self.failures.forget(uid)
+        if field in ("lastTimeFap", "username", "isBlocked"):
+            self._refresh_leaderboard(user)
+        if field in ("lastTimeFap", "isBlocked", "isWinner"):
+            self.rescheduleUser(uid)
+
+    @staticmethod
+    def _is_on_leaderboard(user: UserStat) -> bool:
+        return not user.isBlocked and bool(user.username)
+
+    def _refresh_leaderboard(self, user: UserStat):
+        self.leaderboard_version += 1
+        if self._is_on_leaderboard(user):
+            self.leaderboard.move(user.uid, user.lastTimeFap)
+        else:
+            self.leaderboard.remove(user.uid)
+
+    def _last_meme_day(self, user: UserStat) -> Optional[int]:
+        if not user.memeIds:
+            return None
+        return self.memes.day_of_id(user.memeIds[-1]) or 0
+
+    def _plan_due(
+        self, user: UserStat, now: datetime
+    ) -> Tuple[Optional[float], Optional[int]]:
+        """
+        Когда пользователя пора обработать в checkRating.
+
+        Returns:
+            (время в секундах, None) - поставить в очередь; (None, день) -
+            припарковать победителя до появления мемов этого дня;
+            (None, None) - не обрабатывать
+        """
+        if user.isBlocked:
+            return None, None
+        last_day = self._last_meme_day(user)
+        days = (now - user.lastTimeFap).days
+        if last_day is None:
+            next_day, due = 0, user.lastTimeFap
+        elif days < last_day:
+            # Был сброс после последнего мема - выдаем мем текущего дня серии
+            next_day, due = max(days, 0), user.lastTimeFap
+            if user.isWinner and not self.memes.has_day(next_day):
+                # День серии растет: на следующей границе дня нужен мем уже
+                # другого дня, поэтому не паркуем, а проверяем снова
+                return to_seconds(user.lastTimeFap + timedelta(days=days + 1)), None
+        else:
+            next_day = last_day + 1
+            due = user.lastTimeFap + timedelta(days=next_day)
+        if user.isWinner and not self.memes.has_day(next_day):
+            return None, next_day
+        return to_seconds(due), None
+
+    def _build_due_queue(self):
+        now = datetime.now()
+        entries, parked = list(), list()
+        for uid, user in self.data.items():
+            due, waiting_day = self._plan_due(user, now)
+            if due is not None:
+                entries.append((due, uid))
+            elif waiting_day is not None:
+                parked.append((uid, waiting_day))
+        # build сбрасывает припаркованных, поэтому паркуем после него
+        self.due_queue.build(entries)
+        for uid, waiting_day in parked:
+            self.due_queue.park(uid, waiting_day)
+
+    def rescheduleUser(self, uid: int, not_before: Optional[datetime] = None):
+        """Пересчитывает место пользователя в очереди checkRating."""
+        user = self.data.get(uid)
+        if user is None:
+            self.due_queue.remove(uid)
+            return
+        due, waiting_day = self._plan_due(user, datetime.now())
+        if due is not None:
+            if not_before is not None:
+                due = max(due, to_seconds(not_before))
+            retry_at = self.failures.retry_at(uid)
+            if retry_at is not None:
+                due = max(due, to_seconds(datetime.fromtimestamp(retry_at)))
+            self.due_queue.schedule(uid, due)
+        elif waiting_day is not None:
+            self.due_queue.park(uid, waiting_day)
+        else:
+            self.due_queue.remove(uid)
+
+    def unparkWinners(self) -> int:
+        """
+        Возвращает в очередь победителей, для которых появились мемы.
+
+        Returns:
+            int: Сколько пользователей вернулось в очередь
+        """
+        ready = [
+            uid
+            for uid, waiting_day in self.due_queue.parked().items()
+            if self.memes.has_day(waiting_day)
+        ]
+        for uid in ready:
+            self.rescheduleUser(uid)
+        return len(ready)
+
+    def _snapshot(self) -> Dict[int, UserStat]:
+        return {uid: stat.copy() for uid, stat in self.data.items()}
+
+    def _take_dirty_batch(self):
+        """
+        Забирает набор изменённых пользователей для сохранения.
+
+        Returns:
+            (dirty uids, копии изменённых, полный снапшот или None) или None,
+            если сохранять нечего
+        """
+        dirty = self._dirty_uids
+        if not dirty:
+            self.flush_stats.record_skip()
+            return None
+        self._dirty_uids = set()
+        if not self.storage.needs_snapshot:
+            return dirty, dict(), None
+        if self.storage.wants_full_snapshot(len(dirty), len(self.data)):
+            snapshot = self._snapshot()
+            return dirty, {uid: snapshot[uid] for uid in dirty}, snapshot
+        changed = {uid: self.data[uid].copy() for uid in dirty}
+        return dirty, changed, None
+
+    def _restore_dirty(self, dirty: Set[int]):
+        # Сохранение не удалось - эти пользователи уйдут в следующий flush
+        self._dirty_uids |= dirty
+
+    def _record_flush(self, dirty: Set[int], snapshot, written: int):
+        self.flush_stats.record(len(dirty), written, snapshot is not None)
+        if snapshot is not None:
+            noFapLogger.info(
+                f"💾 Full database snapshot: {len(dirty)} dirty users, "
+                f"{written} bytes written"
+            )
+
+    def _mark_dirty(self, uid: int):
+        self._dirty_uids.add(uid)
+        if self.persister.running:
+            self.persister.mark_dirty()
+
+    def _request_flush(self):
+        if self.persister.running:
+            self.persister.mark_dirty()
+            return
+        # Без фоновой задачи (скрипты, миграции) сохраняем сразу
+        batch = self._take_dirty_batch()
+        if batch is None:
+            return
+        dirty, changed, snapshot = batch
+        try:
+            written = self._run_storage_io(self.storage.flush, changed, snapshot)
+        except BaseException:
+            self._restore_dirty(dirty)
+            raise
+        self._record_flush(dirty, snapshot, written)
+
+    def _run_storage_io(self, func, *args):
+        with self._io_lock:
+            return func(*args)
+
+    async def _flush_in_background(self):
+        batch = self._take_dirty_batch()
+        if batch is None:
+            return
+        dirty, changed, snapshot = batch
+        loop = asyncio.get_running_loop()
+        try:
+            written = await loop.run_in_executor(
+                None, self._run_storage_io, self.storage.flush, changed, snapshot
+            )
+        except BaseException:
+            self._restore_dirty(dirty)
+            raise
+        self._record_flush(dirty, snapshot, written)
+
+    def start_persistence(self):
+        """Включает отложенное сохранение. Вызывается из запущенного event loop."""
+        self.persister.start()
+
+    async def saveFailures(self):
+        """Сохраняет реестр проблемных пользователей, если он менялся."""
+        items = self.failures.take_snapshot()
+        if items is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.failures.write, items)
+
+    async def close(self):
+        """Сохраняет несохраненные изменения и закрывает хранилище."""
+        await self.persister.stop()
+        await self.saveFailures()
+        await self.memes.flush()
+        with self._io_lock:
+            self.storage.close()
+
+    async def compact(self):
+        """Сворачивает журнал или дельту изменений в снапшот, не блокируя loop."""
+        if not self.storage.begin_compaction():
+            return
+        snapshot = self._snapshot()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, self._run_storage_io, self.storage.finish_compaction, snapshot
+        )
+
+    async def prepareBackup(self):
+        """Приводит JSON файл базы в актуальное состояние перед бэкапом в S3."""
+        await self.compact()
+        if not self.storage.begin_export():
+            return
+        snapshot = self._snapshot()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, self._run_storage_io, self.storage.export_json, snapshot
+        )
+
+    def getCallerStat(self, caller: int) -> Optional[Tuple[int, UserStat]]:
+        """Место пользователя в статистике (с единицы) и его запись."""
+        caller = int(caller)
+        callerUser = self.data.get(caller)
+        if callerUser is None or callerUser.isBlocked:
+            return None
+        if caller in self.leaderboard:
+            return self.leaderboard.rank(caller) + 1, callerUser
+        position = self.leaderboard.position(callerUser.lastTimeFap, caller)
+        return position + 1, callerUser
 
     def getTop(
         self, page: int = 0, caller: int = -1
     ) -> Tuple[List[UserStat], Tuple[int, UserStat]]:
-        filter_func = lambda user: not user.isBlocked and (
-            user.username or user.uid == int(caller)
-        )
-        filtered_data = filter(filter_func, self.data.values())
-        sorted_data = sorted(filtered_data, key=lambda x: x.lastTimeFap)
-        callerStat = None
-        for i in range(len(sorted_data)):
-            stat = sorted_data[i]
-            if stat.uid == int(caller):
-                callerStat = (i + 1, stat)
-                break
-
-        return sorted_data[page * 10 : (page + 1) * 10], callerStat
+        caller = int(caller)
+        start, stop = page * 10, (page + 1) * 10
+        callerStat = self.getCallerStat(caller)
+
+        if callerStat is None or caller in self.leaderboard:
+            uids = self.leaderboard.slice(start, stop)
+        else:
+            # Пользователь без ника видит себя в таблице, остальные - нет
+            position = callerStat[0] - 1
+            if position < start:
+                uids = self.leaderboard.slice(start - 1, stop - 1)
+            elif position >= stop:
+                uids = self.leaderboard.slice(start, stop)
+            else:
+                uids = self.leaderboard.slice(start, stop - 1)
+                uids.insert(position - start, caller)
+
+        return [self.data[uid] for uid in uids], callerStat
 
 
 if __name__ == "__main__":
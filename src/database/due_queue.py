@@ -0,0 +1,99 @@
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Наивное "время эпохи": разность наивных datetime, как в (now - lastTimeFap)
+_EPOCH = datetime(1970, 1, 1)
+
+# (время в секундах по to_seconds, uid)
+DueKey = Tuple[float, int]
+
+
+def to_seconds(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+class DueQueue:
+    """
+    Очередь пользователей по времени, когда им пора в checkRating.
+
+    Куча (due, uid) с ленивым удалением: при переносе пользователя старая
+    запись остается в куче и пропускается при извлечении, актуальное время
+    хранится в _due_by_uid. Припаркованные пользователи (победители, ждущие
+    мемов следующего дня) в куче не лежат вовсе.
+    """
+
+    def __init__(self):
+        self._heap: List[DueKey] = list()
+        self._due_by_uid: Dict[int, float] = dict()
+        # uid -> день, мем которого нужен, чтобы пользователь снова стал активен
+        self._parked: Dict[int, int] = dict()
+
+    def build(self, entries: Iterable[DueKey]):
+        """Строит очередь с нуля (используется при загрузке)."""
+        self._heap = list(entries)
+        heapify(self._heap)
+        self._due_by_uid = {uid: due for due, uid in self._heap}
+        self._parked = dict()
+
+    def __len__(self) -> int:
+        return len(self._due_by_uid)
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._due_by_uid
+
+    @property
+    def parked_count(self) -> int:
+        return len(self._parked)
+
+    def schedule(self, uid: int, due: float):
+        self._parked.pop(uid, None)
+        if self._due_by_uid.get(uid) == due:
+            return
+        self._due_by_uid[uid] = due
+        heappush(self._heap, (due, uid))
+        # Не даем устаревшим записям разрастись сверх размера очереди
+        if len(self._heap) > 2 * len(self._due_by_uid) + 1024:
+            self._rebuild()
+
+    def park(self, uid: int, waiting_day: int):
+        self.remove(uid)
+        self._parked[uid] = waiting_day
+
+    def parked(self) -> Dict[int, int]:
+        return dict(self._parked)
+
+    def remove(self, uid: int):
+        self._due_by_uid.pop(uid, None)
+        self._parked.pop(uid, None)
+
+    def due(self, uid: int) -> Optional[float]:
+        return self._due_by_uid.get(uid)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_next(self, now: float) -> Optional[int]:
+        """Извлекает пользователя с самым ранним временем, если оно наступило к now."""
+        self._drop_stale()
+        if not self._heap or self._heap[0][0] > now:
+            return None
+        _, uid = heappop(self._heap)
+        del self._due_by_uid[uid]
+        return uid
+
+    def count_due(self, now: float) -> int:
+        """Сколько пользователей ждут обработки к now (проход по всей очереди)."""
+        return sum(1 for due in self._due_by_uid.values() if due <= now)
+
+    def _drop_stale(self):
+        while self._heap:
+            due, uid = self._heap[0]
+            if self._due_by_uid.get(uid) == due:
+                return
+            heappop(self._heap)
+
+    def _rebuild(self):
+        self._heap = [(due, uid) for uid, due in self._due_by_uid.items()]
+        heapify(self._heap)
@@ -0,0 +1,126 @@
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from logger import noFapLogger
+from src.utils.json_encoder import write_json_atomic
+
+# Разброс времени повтора, чтобы пользователи, упавшие вместе, не вернулись вместе
+JITTER = 0.2
+
+
+class FailureEntry:
+    __slots__ = ("count", "retry_at", "error")
+
+    def __init__(self, count: int, retry_at: float, error: str):
+        self.count = count
+        # Время по time.time(), чтобы переживать перезапуск
+        self.retry_at = retry_at
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FailureRegistry:
+    """
+    Пользователи, обращения к которым недавно падали, и когда их пробовать снова.
+
+    Здесь только временные ошибки: пауза растет экспоненциально с числом
+    ошибок подряд от base_delay до max_delay. Постоянные ошибки (чат удален,
+    бот заблокирован) сюда не попадают - такие пользователи блокируются через
+    bannedFlag. Успешная обработка или входящее сообщение от пользователя
+    снимают запись.
+    Размер ограничен max_size: при переполнении забываются записи, которые
+    дольше всех не обновлялись.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        base_delay: float,
+        max_delay: float,
+        max_size: int,
+    ):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, FailureEntry]" = OrderedDict()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._entries
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            noFapLogger.warning(f"⚠️ Failed to read failed users registry: {e}")
+            return
+        # Файл упорядочен от старых записей к новым
+        for uid, item in items:
+            # Поле permanent писали старые версии
+            item.pop("permanent", None)
+            self._entries[int(uid)] = FailureEntry(**item)
+        self._evict()
+
+    def is_backing_off(self, uid: int, now: Optional[float] = None) -> bool:
+        entry = self._entries.get(uid)
+        if entry is None:
+            return False
+        return entry.retry_at > (time.time() if now is None else now)
+
+    def retry_at(self, uid: int) -> Optional[float]:
+        entry = self._entries.get(uid)
+        return entry.retry_at if entry else None
+
+    def record_failure(self, uid: int, error: str) -> float:
+        """
+        Учитывает ошибку и назначает время следующей попытки.
+
+        Returns:
+            float: Время следующей попытки по time.time()
+        """
+        entry = self._entries.pop(uid, None)
+        count = entry.count + 1 if entry else 1
+        delay = min(self.base_delay * 2 ** (count - 1), self.max_delay)
+        delay *= random.uniform(1 - JITTER, 1 + JITTER)
+        retry_at = time.time() + delay
+        self._entries[uid] = FailureEntry(count, retry_at, error)
+        self._evict()
+        self._dirty = True
+        return retry_at
+
+    def forget(self, uid: int):
+        if self._entries.pop(uid, None) is not None:
+            self._dirty = True
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._dirty = True
+
+    def take_snapshot(self) -> Optional[list]:
+        """Записи для сохранения или None, если с прошлого раза ничего не менялось."""
+        if not self._dirty or self.path is None:
+            return None
+        self._dirty = False
+        return [[uid, entry.to_dict()] for uid, entry in self._entries.items()]
+
+    def write(self, items: list):
+        """Пишет снимок take_snapshot на диск. Можно вызывать из рабочего потока."""
+        try:
+            write_json_atomic(self.path, items)
+        except OSError as e:
+            self._dirty = True
+            noFapLogger.error(f"❌ Failed to save failed users registry: {e}")
@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+from typing import Dict
+
+from logger import noFapLogger
+from src.utils.json_encoder import EnhancedJSONEncoder
+
+from .user_stat import UserStat, parse_datetime
+
+
+def apply_record(data: Dict[int, UserStat], record: dict):
+    """
+    Применяет одну запись журнала к загруженным пользователям.
+
+    Все записи идемпотентны: повторное применение журнала поверх снапшота,
+    в который он уже был свёрнут, даёт то же самое состояние.
+    """
+    op = record["op"]
+    uid = int(record["uid"])
+    if op in ("new", "put"):
+        # put - полное состояние изменённого пользователя (дельта снапшота)
+        data[uid] = UserStat.from_dict(record["v"])
+    elif op == "set":
+        value = record["v"]
+        if record["f"] == "lastTimeFap":
+            value = parse_datetime(value)
+        setattr(data[uid], record["f"], value)
+    elif op == "meme":
+        data[uid].setMeme(record["i"], record["v"])
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+
+class DatabaseJournal:
+    """
+    Append-only журнал изменений базы данных в формате JSON Lines.
+
+    Записи добавляются из event loop, а sync может вызываться из рабочего
+    потока, поэтому операции с файлом защищены блокировкой.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rotated_path = f"{path}.1"
+        self.records_count = 0
+        # Байты, дописанные с последнего sync
+        self.pending_bytes = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def append(self, record: dict):
+        """Дописывает одну компактную запись в конец журнала."""
+        line = json.dumps(record, cls=EnhancedJSONEncoder, separators=(",", ":"))
+        line += "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = self._open_for_append()
+            self._file.write(line)
+            # Отдаём запись ОС сразу, fsync делается в sync()
+            self._file.flush()
+            self.records_count += 1
+            self.pending_bytes += len(line.encode("utf-8"))
+
+    def _open_for_append(self):
+        needs_newline = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        journal_file = open(self.path, "a", encoding="utf-8")
+        if needs_newline:
+            # Отделяем оборванную запись, чтобы не склеить её со следующей
+            journal_file.write("\n")
+        return journal_file
+
+    def sync(self) -> int:
+        """
+        Сбрасывает журнал на диск.
+
+        Returns:
+            int: Сколько байт было дописано с предыдущего sync
+        """
+        with self._lock:
+            self._sync()
+            written, self.pending_bytes = self.pending_bytes, 0
+        return written
+
+    def _sync(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def rotate(self) -> bool:
+        """
+        Откладывает текущий журнал в сторону для последующей свёртки в снапшот.
+        Новые записи после ротации пишутся в свежий файл.
+
+        Returns:
+            bool: True если в журнале были записи
+        """
+        with self._lock:
+            self._close()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        if os.path.exists(self.rotated_path):
+            # Предыдущая свёртка не завершилась - дописываем к её журналу
+            with open(self.rotated_path, "a", encoding="utf-8") as rotated, open(
+                self.path, "r", encoding="utf-8"
+            ) as current:
+                rotated.write(current.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+        self.records_count = 0
+        return True
+
+    def clear(self):
+        """Удаляет журнал целиком, когда все его записи попали в снапшот."""
+        with self._lock:
+            self._close()
+            for path in (self.path, self.rotated_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.records_count = 0
+            self.pending_bytes = 0
+
+    def drop_rotated(self):
+        """Удаляет отложенный журнал после успешной записи снапшота."""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def replay(self, data: Dict[int, UserStat]) -> int:
+        """
+        Применяет к данным отложенный и текущий журналы.
+
+        Returns:
+            int: Количество применённых записей
+        """
+        applied = 0
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная последняя запись после падения процесса
+                        noFapLogger.warning(
+                            f"⚠️ Skipping broken journal record {path}:{line_number}"
+                        )
+                        continue
+                    apply_record(data, record)
+                    applied += 1
+        self.records_count = applied
+        return applied
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
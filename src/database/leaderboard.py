@@ -0,0 +1,63 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LeaderboardKey = Tuple[datetime, int]
+
+
+class Leaderboard:
+    """
+    Упорядоченный по (lastTimeFap, uid) индекс пользователей, видимых в статистике.
+
+    Ранг и срез страницы находятся бинарным поиском за O(log N). Вставка и
+    удаление обновляют индекс точечно, без пересортировки всех пользователей,
+    но сдвигают хвост списка, то есть стоят O(N) копирования (memmove). На
+    текущих размерах базы это микросекунды; если обновлений станет намного
+    больше, список стоит заменить на сортированный контейнер с бакетами.
+    """
+
+    def __init__(self):
+        self._keys: List[LeaderboardKey] = list()
+        self._key_by_uid: Dict[int, LeaderboardKey] = dict()
+
+    def build(self, entries: Iterable[LeaderboardKey]):
+        """Строит индекс с нуля одной сортировкой (используется при загрузке)."""
+        self._keys = sorted(entries)
+        self._key_by_uid = {uid: (lastTimeFap, uid) for lastTimeFap, uid in self._keys}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._key_by_uid
+
+    def add(self, uid: int, lastTimeFap: datetime):
+        key = (lastTimeFap, uid)
+        self._key_by_uid[uid] = key
+        insort(self._keys, key)
+
+    def remove(self, uid: int):
+        key = self._key_by_uid.pop(uid, None)
+        if key is None:
+            return
+        del self._keys[bisect_left(self._keys, key)]
+
+    def move(self, uid: int, lastTimeFap: datetime):
+        if self._key_by_uid.get(uid) == (lastTimeFap, uid):
+            return
+        self.remove(uid)
+        self.add(uid, lastTimeFap)
+
+    def rank(self, uid: int) -> Optional[int]:
+        """Позиция пользователя в индексе (с нуля) или None если его там нет."""
+        key = self._key_by_uid.get(uid)
+        if key is None:
+            return None
+        return bisect_left(self._keys, key)
+
+    def position(self, lastTimeFap: datetime, uid: int) -> int:
+        """Позиция, которую занял бы ключ (lastTimeFap, uid)."""
+        return bisect_left(self._keys, (lastTimeFap, uid))
+
+    def slice(self, start: int, stop: int) -> List[int]:
+        return [uid for _, uid in self._keys[max(start, 0) : max(stop, 0)]]
@@ -0,0 +1,405 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from bisect import insort
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from logger import noFapLogger
+from src.utils.json_encoder import write_json_atomic
+
+MANIFEST_VERSION = 1
+# "day 3_2.jpg" -> мем третьего дня
+MEME_FILE_PATTERN = re.compile(r"^\S+ (\d+)_")
+
+
+def parse_meme_day(name: str) -> Optional[int]:
+    """День мема по имени файла или None, если имя не по формату."""
+    match = MEME_FILE_PATTERN.match(name)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MemeEntry:
+    """Запись манифеста о файле мема, лежащем в папке мемов."""
+
+    __slots__ = ("id", "day", "filename", "size", "mtime_ns", "sha256", "file_id")
+
+    def __init__(
+        self,
+        id: Optional[int],
+        day: int,
+        filename: str,
+        size: int,
+        mtime_ns: int,
+        sha256: str,
+        file_id: Optional[str] = None,
+    ):
+        self.id = id
+        self.day = day
+        self.filename = filename
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.sha256 = sha256
+        self.file_id = file_id
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass
+class CatalogChanges:
+    """Что изменилось в папке мемов при перечитывании каталога."""
+
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    # Дни, для которых раньше не было ни одного мема
+    new_days: List[int] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.updated)
+
+
+class MemeCatalog:
+    """
+    Общий справочник мемов.
+
+    Имена файлов интернируются в компактные целочисленные id (их хранит
+    UserStat), а для файлов в папке мемов ведется манифест с днем, размером,
+    хэшем и Telegram file_id. Манифест сохраняется рядом с папкой, поэтому при
+    старте хэши считаются только для новых и изменённых файлов.
+
+    Во время работы бота изменения манифеста (новые file_id) копятся в памяти
+    и записываются на диск вызовом flush в рабочем потоке.
+    """
+
+    def __init__(self):
+        self._names: List[str] = list()
+        self._ids: Dict[str, int] = dict()
+        # День мема по его id (None - имя не по формату)
+        self._days: List[Optional[int]] = list()
+        self._entries: Dict[str, MemeEntry] = dict()
+        self._by_day: Dict[int, List[str]] = dict()
+        self.folder: Optional[str] = None
+        self.manifest_path: Optional[str] = None
+        self.malformed: List[str] = list()
+        # mtime папки на момент последнего сканирования
+        self._scanned_mtime: Optional[int] = None
+        self._reloading = False
+        # Манифест в памяти новее, чем на диске
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, name: str) -> int:
+        meme_id = self._ids.get(name)
+        if meme_id is None:
+            meme_id = len(self._names)
+            self._names.append(name)
+            self._ids[name] = meme_id
+            self._days.append(parse_meme_day(name))
+        return meme_id
+
+    def name(self, meme_id: int) -> str:
+        return self._names[meme_id]
+
+    def names(self) -> List[str]:
+        """Все имена по порядку id."""
+        return list(self._names)
+
+    def day_of(self, name: str) -> Optional[int]:
+        return self._days[self.intern(name)]
+
+    def day_of_id(self, meme_id: int) -> Optional[int]:
+        return self._days[meme_id]
+
+    def has_day(self, day: int) -> bool:
+        return day in self._by_day
+
+    def memes_for_day(self, day: int) -> List[str]:
+        return self._by_day.get(day, [])
+
+    def days(self) -> List[int]:
+        return sorted(self._by_day)
+
+    def entry(self, name: str) -> Optional[MemeEntry]:
+        return self._entries.get(name)
+
+    def entries(self) -> List[MemeEntry]:
+        """Мемы из папки, упорядоченные по дню и имени файла."""
+        return sorted(self._entries.values(), key=lambda e: (e.day, e.filename))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder or "", name)
+
+    def load(self, folder: str, manifest_path: str):
+        """
+        Загружает манифест и сверяет его с содержимым папки мемов.
+
+        Файлы с именем не по формату "<префикс> <день>_<номер>" пропускаются и
+        попадают в malformed, а не роняют старт бота.
+        """
+        self.folder = folder
+        self.manifest_path = manifest_path
+        known = self._read_manifest()
+
+        entries, self.malformed, self._scanned_mtime = self._scan(known)
+        self._entries = dict()
+        self._by_day = dict()
+        for entry in entries.values():
+            self._add_entry(entry)
+
+        self._report_malformed()
+        if entries.keys() != known.keys() or any(
+            entry is not known[name] for name, entry in entries.items()
+        ):
+            self.save()
+        noFapLogger.info(
+            f"🖼️ Meme catalog loaded: {len(self._entries)} memes "
+            f"for {len(self._by_day)} days"
+        )
+
+    async def reload(self, force: bool = False) -> Optional[CatalogChanges]:
+        """
+        Подхватывает добавленные, удалённые и изменённые файлы мемов.
+
+        Без force папка сканируется, только если поменялся её mtime (файл
+        добавили, удалили или переименовали). Сканирование и хэширование идут
+        в рабочем потоке, каталог обновляется точечно в event loop.
+
+        Returns:
+            CatalogChanges или None, если папка не сканировалась
+        """
+        if self.folder is None or self._reloading:
+            return None
+        if not force and self._folder_mtime() == self._scanned_mtime:
+            return None
+
+        known = dict(self._entries)
+        loop = asyncio.get_running_loop()
+        self._reloading = True
+        try:
+            entries, malformed, scanned_mtime = await loop.run_in_executor(
+                None, self._scan, known
+            )
+        finally:
+            self._reloading = False
+
+        changes = CatalogChanges()
+        days_before = set(self._by_day)
+        for name, entry in known.items():
+            if name not in entries:
+                self._remove_entry(entry)
+                changes.removed.append(name)
+        for name, entry in entries.items():
+            old_entry = known.get(name)
+            if old_entry is None:
+                changes.added.append(name)
+            elif entry is not old_entry:
+                self._remove_entry(old_entry)
+                changes.updated.append(name)
+            else:
+                continue
+            self._add_entry(entry)
+        changes.new_days = sorted(set(self._by_day) - days_before)
+
+        if malformed != self.malformed:
+            self.malformed = malformed
+            self._report_malformed()
+        self._scanned_mtime = scanned_mtime
+        if changes:
+            self._dirty = True
+            await self.flush()
+        return changes
+
+    def _folder_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan(
+        self, known: Dict[str, MemeEntry]
+    ) -> Tuple[Dict[str, MemeEntry], List[str], Optional[int]]:
+        """
+        Сверяет папку мемов с известными записями. Не меняет каталог, поэтому
+        может выполняться в рабочем потоке.
+
+        Returns:
+            (записи всех файлов папки, имена не по формату, mtime папки).
+            Для неизменённых файлов возвращаются те же объекты из known.
+        """
+        folder_mtime = self._folder_mtime()
+        entries = dict()
+        malformed = list()
+        if folder_mtime is None:
+            return entries, malformed, folder_mtime
+        for file_name in sorted(os.listdir(self.folder)):
+            if not os.path.isfile(os.path.join(self.folder, file_name)):
+                continue
+            day = parse_meme_day(file_name)
+            if day is None:
+                malformed.append(file_name)
+                continue
+            entries[file_name] = self._make_entry(file_name, day, known.get(file_name))
+        return entries, malformed, folder_mtime
+
+    def _report_malformed(self):
+        if self.malformed:
+            noFapLogger.warning(
+                f"⚠️ Skipping memes with malformed names: {', '.join(self.malformed)}"
+            )
+
+    def _read_manifest(self) -> Dict[str, MemeEntry]:
+        if not os.path.exists(self.manifest_path):
+            return dict()
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            noFapLogger.warning(f"⚠️ Failed to read meme manifest: {e}")
+            return dict()
+        if manifest.get("version") != MANIFEST_VERSION:
+            return dict()
+
+        known = dict()
+        # Интернируем в порядке id манифеста, чтобы id не менялись между запусками
+        for item in sorted(manifest["memes"], key=lambda item: item["id"]):
+            item["id"] = self.intern(item["filename"])
+            known[item["filename"]] = MemeEntry(**item)
+        return known
+
+    def _make_entry(
+        self, file_name: str, day: int, known: Optional[MemeEntry]
+    ) -> MemeEntry:
+        path = os.path.join(self.folder, file_name)
+        stat = os.stat(path)
+        if (
+            known is not None
+            and known.size == stat.st_size
+            and known.mtime_ns == stat.st_mtime_ns
+        ):
+            return known
+        sha256 = file_sha256(path)
+        # file_id переживает touch файла, но не изменение содержимого
+        file_id = known.file_id if known and known.sha256 == sha256 else None
+        return MemeEntry(
+            known.id if known else None,
+            day,
+            file_name,
+            stat.st_size,
+            stat.st_mtime_ns,
+            sha256,
+            file_id,
+        )
+
+    def _add_entry(self, entry: MemeEntry):
+        # id выдается здесь, а не в _scan, чтобы интернирование шло только в loop
+        entry.id = self.intern(entry.filename)
+        self._entries[entry.filename] = entry
+        insort(self._by_day.setdefault(entry.day, []), entry.filename)
+
+    def _remove_entry(self, entry: MemeEntry):
+        self._entries.pop(entry.filename, None)
+        day_memes = self._by_day.get(entry.day)
+        if day_memes is None or entry.filename not in day_memes:
+            return
+        day_memes.remove(entry.filename)
+        if not day_memes:
+            del self._by_day[entry.day]
+
+    def take_snapshot(self) -> Optional[dict]:
+        """Манифест для сохранения или None, если с прошлого раза ничего не менялось."""
+        if not self._dirty or self.manifest_path is None:
+            return None
+        self._dirty = False
+        return {
+            "version": MANIFEST_VERSION,
+            "memes": [entry.to_dict() for entry in self.entries()],
+        }
+
+    def write(self, manifest: dict):
+        """Пишет снимок take_snapshot на диск. Можно вызывать из рабочего потока."""
+        try:
+            write_json_atomic(self.manifest_path, manifest)
+        except OSError as e:
+            self._dirty = True
+            noFapLogger.error(f"❌ Failed to save meme manifest: {e}")
+
+    def save(self):
+        """Синхронное сохранение, только при загрузке каталога."""
+        self._dirty = True
+        manifest = self.take_snapshot()
+        if manifest is not None:
+            self.write(manifest)
+
+    async def flush(self):
+        """Сохраняет манифест, если он менялся, не блокируя event loop."""
+        manifest = self.take_snapshot()
+        if manifest is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.write, manifest)
+
+    async def file_id(self, name: str) -> Optional[str]:
+        """
+        Telegram file_id мема или None, если мем еще не загружался или файл
+        изменился с момента загрузки.
+        """
+        entry = self._entries.get(name)
+        if entry is None or entry.file_id is None:
+            return None
+        try:
+            stat = os.stat(self.path(name))
+        except OSError:
+            return None
+        if entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            return entry.file_id
+
+        # Файл трогали - проверяем, поменялось ли содержимое
+        loop = asyncio.get_running_loop()
+        try:
+            sha256 = await loop.run_in_executor(None, file_sha256, self.path(name))
+        except OSError:
+            return None
+        if self._entries.get(name) is not entry:
+            # Пока считали хэш, каталог перечитали - запись уже неактуальна
+            return None
+        if sha256 != entry.sha256:
+            noFapLogger.info(f"🔄 Meme {name} changed, dropping its file_id")
+            entry.sha256 = sha256
+            entry.file_id = None
+        entry.size = stat.st_size
+        entry.mtime_ns = stat.st_mtime_ns
+        self._dirty = True
+        return entry.file_id
+
+    def set_file_id(self, name: str, file_id: Optional[str]):
+        """
+        Запоминает (или сбрасывает при None) file_id загруженного мема.
+        На диск изменение попадет при следующем flush.
+        """
+        entry = self._entries.get(name)
+        if entry is None or entry.file_id == file_id:
+            return
+        entry.file_id = file_id
+        self._dirty = True
+
+    def cached_file_ids(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.file_id)
+
+
+meme_catalog = MemeCatalog()
@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from logger import noFapLogger
+
+
+class FlushStats:
+    """Счётчики сохранений базы: сколько пользователей и байт уходит за flush."""
+
+    def __init__(self):
+        self.flushes = 0
+        self.full_snapshots = 0
+        self.skipped = 0
+        self.dirty_users = 0
+        self.bytes_written = 0
+        self.last_dirty_users = 0
+        self.last_bytes_written = 0
+
+    def record(self, dirty_users: int, bytes_written: int, full: bool):
+        self.flushes += 1
+        if full:
+            self.full_snapshots += 1
+        self.dirty_users += dirty_users
+        self.bytes_written += bytes_written
+        self.last_dirty_users = dirty_users
+        self.last_bytes_written = bytes_written
+
+    def record_skip(self):
+        self.skipped += 1
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "full_snapshots": self.full_snapshots,
+            "skipped": self.skipped,
+            "last_dirty_users": self.last_dirty_users,
+            "last_bytes_written": self.last_bytes_written,
+            "avg_dirty_users": self.dirty_users / self.flushes if self.flushes else 0.0,
+            "avg_bytes_written": (
+                self.bytes_written / self.flushes if self.flushes else 0.0
+            ),
+        }
+
+
+class WriteBehindPersister:
+    """
+    Отложенное сохранение базы.
+
+    Мутации только помечают базу "грязной", а фоновая задача сохраняет ее не
+    чаще одного раза за interval секунд, объединяя всплески изменений в одну
+    запись. Сама запись выполняется переданной корутиной flush.
+    """
+
+    def __init__(self, flush: Callable[[], Awaitable[None]], interval: float):
+        self._flush = flush
+        self.interval = interval
+        self._dirty = False
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        noFapLogger.info(f"💾 Write-behind persistence started ({self.interval}s)")
+
+    def mark_dirty(self):
+        self._dirty = True
+        if self._event is not None:
+            self._event.set()
+
+    async def flush(self):
+        """Сохраняет базу прямо сейчас, если есть несохраненные изменения."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            await self._flush()
+        except asyncio.CancelledError:
+            self._dirty = True
+            raise
+        except Exception as e:
+            # Оставляем базу грязной, следующая попытка будет через interval
+            self._dirty = True
+            noFapLogger.error(f"❌ Failed to persist database: {e}")
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            # Ждем, чтобы собрать в одну запись все изменения за интервал
+            await asyncio.sleep(self.interval)
+            self._event.clear()
+            await self.flush()
+            if self._dirty:
+                self._event.set()
+
+    async def stop(self):
+        """Останавливает фоновую задачу и делает финальное сохранение."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        noFapLogger.info("💾 Write-behind persistence stopped, database flushed")
@@ -0,0 +1,103 @@
+import os
+import pickle
+import struct
+import tempfile
+from array import array
+from typing import Dict, Optional
+
+from logger import noFapLogger
+
+from .meme_catalog import meme_catalog
+from .user_stat import UserStat, parse_datetime
+
+SNAPSHOT_MAGIC = b"NFDB"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sH")
+
+
+def binary_snapshot_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".bin"
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def write_binary_snapshot(
+    path: str, data: Dict[int, UserStat], source_path: str
+) -> int:
+    """
+    Записывает бинарный снапшот рядом с JSON файлом базы.
+
+    Снапшот помнит подпись (mtime, размер) JSON файла, из которого он получен,
+    и считается устаревшим, если JSON с тех пор поменялся.
+
+    Returns:
+        int: Размер записанного файла в байтах
+    """
+    payload = {
+        "source": _file_signature(source_path),
+        "memes": meme_catalog.names(),
+        "users": [
+            (
+                user.uid,
+                user.username,
+                user.lastTimeFap.isoformat(),
+                user.memeIds.tobytes(),
+                user.isBlocked,
+                user.isWinner,
+            )
+            for user in data.values()
+        ],
+    }
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+            pickle.dump(payload, f, protocol=5)
+            f.flush()
+            os.fsync(f.fileno())
+            written = f.tell()
+        os.replace(temp_path, path)
+        return written
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_binary_snapshot(path: str, source_path: str) -> Optional[Dict[int, UserStat]]:
+    """Читает бинарный снапшот или возвращает None, если он отсутствует или устарел."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            magic, version = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                noFapLogger.warning(f"⚠️ Unsupported binary snapshot {path}")
+                return None
+            payload = pickle.load(f)
+    except Exception as e:
+        noFapLogger.warning(f"⚠️ Failed to read binary snapshot {path}: {e}")
+        return None
+
+    if payload["source"] != _file_signature(source_path):
+        noFapLogger.info(f"Binary snapshot {path} is outdated, loading JSON")
+        return None
+
+    remap = [meme_catalog.intern(name) for name in payload["memes"]]
+    identity = remap == list(range(len(remap)))
+    data = dict()
+    for uid, username, lastTimeFap, memes, isBlocked, isWinner in payload["users"]:
+        user = UserStat(
+            uid, username, parse_datetime(lastTimeFap), (), isBlocked, isWinner
+        )
+        user.memeIds.frombytes(memes)
+        if not identity:
+            user.memeIds = array("H", [remap[meme_id] for meme_id in user.memeIds])
+        data[uid] = user
+    return data
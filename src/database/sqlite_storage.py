@@ -0,0 +1,216 @@
+import json
+import os
+import sqlite3
+import threading
+from argparse import ArgumentParser
+from datetime import datetime
+from typing import Dict, Optional
+
+from logger import noFapLogger
+from src.utils.json_encoder import write_json_atomic
+
+from .storage import Storage
+from .user_stat import UserStat, parse_datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid INTEGER PRIMARY KEY,
+    username TEXT,
+    lastTimeFap TEXT NOT NULL,
+    isBlocked INTEGER NOT NULL DEFAULT 0,
+    isWinner INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS collected_memes (
+    uid INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    meme TEXT NOT NULL,
+    PRIMARY KEY (uid, position)
+);
+-- Все выборки идут по первичному ключу, вторичные индексы только замедляли
+-- запись; удаляем их из баз, созданных прежней схемой
+DROP INDEX IF EXISTS idx_users_username;
+DROP INDEX IF EXISTS idx_users_is_blocked;
+DROP INDEX IF EXISTS idx_users_is_winner;
+DROP INDEX IF EXISTS idx_users_last_time_fap;
+"""
+
+# Поля UserStat, которые хранятся колонками таблицы users
+USER_COLUMNS = ("username", "lastTimeFap", "isBlocked", "isWinner")
+
+
+def _to_column(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+class SqliteStorage(Storage):
+    """
+    Хранение базы в SQLite (WAL режим).
+
+    Каждая мутация - точечный UPDATE/INSERT, фиксация транзакции происходит
+    при flush. Периодической свёртки нет: WAL SQLite сворачивает сам, а JSON
+    снапшот выгружается только перед бэкапом в S3.
+    """
+
+    def __init__(self, path: str, json_path: str = None):
+        super().__init__(path)
+        self.json_path = json_path
+        self._lock = threading.Lock()
+        self._changed = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def exists(self) -> bool:
+        if self._users_count() > 0:
+            return True
+        return self.json_path is not None and os.path.exists(self.json_path)
+
+    def _users_count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def load(self) -> Dict[int, UserStat]:
+        if (
+            self._users_count() == 0
+            and self.json_path
+            and os.path.exists(self.json_path)
+        ):
+            migrated = self.import_json(self.json_path)
+            noFapLogger.info(f"🗄️ Migrated {migrated} users from {self.json_path}")
+
+        data = dict()
+        with self._lock:
+            users = self._connection.execute(
+                "SELECT uid, username, lastTimeFap, isBlocked, isWinner FROM users"
+            )
+            for uid, username, lastTimeFap, isBlocked, isWinner in users:
+                data[uid] = UserStat(
+                    uid=uid,
+                    username=username,
+                    lastTimeFap=parse_datetime(lastTimeFap),
+                    collectedMemes=(),
+                    isBlocked=bool(isBlocked),
+                    isWinner=bool(isWinner),
+                )
+            for uid, meme in self._connection.execute(
+                "SELECT uid, meme FROM collected_memes ORDER BY uid, position"
+            ):
+                data[uid].addMeme(meme)
+        return data
+
+    def add_user(self, user: UserStat):
+        with self._lock:
+            self._insert_user(user)
+            self._changed = True
+
+    def _insert_user(self, user: UserStat):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO users "
+            "(uid, username, lastTimeFap, isBlocked, isWinner) VALUES (?, ?, ?, ?, ?)",
+            (
+                user.uid,
+                user.username,
+                _to_column(user.lastTimeFap),
+                int(user.isBlocked),
+                int(user.isWinner),
+            ),
+        )
+        self._connection.execute(
+            "DELETE FROM collected_memes WHERE uid = ?", (user.uid,)
+        )
+        self._connection.executemany(
+            "INSERT INTO collected_memes (uid, position, meme) VALUES (?, ?, ?)",
+            [
+                (user.uid, position, meme)
+                for position, meme in enumerate(user.collectedMemes)
+            ],
+        )
+
+    def set_field(self, uid: int, field: str, value):
+        if field not in USER_COLUMNS:
+            raise ValueError(f"Unknown user field: {field}")
+        with self._lock:
+            self._connection.execute(
+                f"UPDATE users SET {field} = ? WHERE uid = ?", (_to_column(value), uid)
+            )
+            self._changed = True
+
+    def add_meme(self, uid: int, index: int, meme: str):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO collected_memes (uid, position, meme) "
+                "VALUES (?, ?, ?)",
+                (uid, index, meme),
+            )
+            self._changed = True
+
+    def flush(
+        self, changed: Dict[int, UserStat], snapshot: Optional[Dict[int, UserStat]]
+    ) -> int:
+        with self._lock:
+            self._connection.commit()
+        return 0
+
+    def begin_export(self) -> bool:
+        if not self._changed or self.json_path is None:
+            return False
+        self._changed = False
+        return True
+
+    def export_json(self, snapshot: Dict[int, UserStat]):
+        # JSON нужен только бэкапам в S3 и для отката на json движок, поэтому
+        # выгружается перед бэкапом, а не при каждой периодической свёртке
+        try:
+            write_json_atomic(self.json_path, snapshot)
+        except OSError:
+            self._changed = True
+            raise
+        with self._lock:
+            self._connection.commit()
+            self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        noFapLogger.info(f"🗜️ SQLite database exported to {self.json_path}")
+
+    def import_json(self, json_path: str) -> int:
+        """
+        Одноразовая миграция: переносит всех пользователей из JSON файла базы.
+
+        Returns:
+            int: Количество перенесённых пользователей
+        """
+        with open(json_path, "r") as f:
+            data = json.load(f)
+
+        with self._lock:
+            for user_data in data.values():
+                self._insert_user(UserStat.from_dict(user_data))
+            self._connection.commit()
+        return len(data)
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Migrate all_scores_saved.json into SQLite")
+    parser.add_argument(
+        "--json", default=os.path.join("storage", "all_scores_saved.json")
+    )
+    parser.add_argument(
+        "--sqlite", default=os.path.join("storage", "all_scores_saved.sqlite3")
+    )
+    args = parser.parse_args()
+
+    storage = SqliteStorage(args.sqlite)
+    migrated = storage.import_json(args.json)
+    storage.close()
+    print(f"Migrated {migrated} users from {args.json} to {args.sqlite}")
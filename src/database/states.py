@@ -70,6 +70,23 @@ class UserContext:
         return f"{type(self).__name__} {json.dumps(self.__dict__)}"
 
 
+class UserContexts(dict):
+    """Контексты пользователей, создаваемые при первом обращении по uid."""
+
+    def __init__(self, users: dict, refresh_callback: Callable):
+        super().__init__()
+        self._users = users
+        self._refresh_callback = refresh_callback
+
+    def __missing__(self, uid):
+        if uid not in self._users:
+            raise KeyError(uid)
+        userContext = UserContext(uid)
+        userContext.addRefreshCallback(callback=self._refresh_callback)
+        self[uid] = userContext
+        return userContext
+
+
 class RefreshUserState(UserState):
     def __init__(self):
         pass
@@ -0,0 +1,258 @@
+import json
+import os
+from typing import Dict, Optional
+
+from config.config import DB_DELTA_MAX_RATIO, DB_DELTA_MAX_RECORDS
+from logger import noFapLogger
+from src.utils.json_encoder import write_json_atomic
+
+from .journal import DatabaseJournal
+from .snapshot import (
+    binary_snapshot_path,
+    read_binary_snapshot,
+    write_binary_snapshot,
+)
+from .user_stat import UserStat
+
+
+class Storage:
+    """
+    Интерфейс движка хранения NoFapDB.
+
+    NoFapDB держит пользователей в памяти и сообщает движку о каждой мутации,
+    а движок решает, как и когда её сохранить. flush и finish_compaction
+    выполняются в рабочем потоке, остальные методы - в event loop.
+    """
+
+    # Нужны ли flush копии изменённых пользователей или движок пишет мутации сам
+    needs_snapshot = False
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        """Есть ли локальные данные, из которых можно загрузить базу."""
+        return os.path.exists(self.path)
+
+    def load(self) -> Dict[int, UserStat]:
+        """Загружает всех пользователей."""
+        raise NotImplementedError
+
+    def add_user(self, user: UserStat):
+        pass
+
+    def set_field(self, uid: int, field: str, value):
+        pass
+
+    def add_meme(self, uid: int, index: int, meme: str):
+        pass
+
+    def wants_full_snapshot(self, dirty_count: int, total_count: int) -> bool:
+        """Нужен ли при следующем flush полный снапшот вместо дельты."""
+        return False
+
+    def flush(
+        self, changed: Dict[int, UserStat], snapshot: Optional[Dict[int, UserStat]]
+    ) -> int:
+        """
+        Сохраняет изменения.
+
+        Args:
+            changed: Копии пользователей, изменённых с прошлого flush
+                (пусто, если needs_snapshot = False)
+            snapshot: Копия всей базы, если wants_full_snapshot вернул True
+
+        Returns:
+            int: Сколько байт было записано (0 если движок не может посчитать)
+        """
+        return 0
+
+    def close(self):
+        pass
+
+    def begin_compaction(self) -> bool:
+        """Готовит свёртку изменений. Вызывается из event loop."""
+        return False
+
+    def finish_compaction(self, snapshot: Dict[int, UserStat]):
+        """Завершает свёртку по снапшоту данных. Можно вызывать в потоке."""
+        pass
+
+    def begin_export(self) -> bool:
+        """
+        Нужно ли перед бэкапом выгрузить JSON снапшот отдельно от свёртки
+        (движки, у которых основное хранилище - не JSON файл).
+        """
+        return False
+
+    def export_json(self, snapshot: Dict[int, UserStat]):
+        """Выгружает JSON снапшот для бэкапа. Можно вызывать в потоке."""
+        pass
+
+    def discard_changes(self):
+        """
+        Удаляет локальные изменения поверх снапшота. Вызывается, когда снапшот
+        восстановлен из бэкапа и старые дельты к нему не относятся.
+        """
+        pass
+
+
+class JsonStorage(Storage):
+    """
+    Хранение всей базы в одном JSON файле.
+
+    Пока изменений немного, flush только дописывает полные записи изменённых
+    пользователей в файл дельты, а JSON переписывается целиком, когда дельта
+    разрастается или изменилась заметная доля пользователей. Кроме того,
+    дельта периодически сворачивается в JSON (compaction), чтобы файл, который
+    уходит в бэкап, не отставал от базы.
+
+    Рядом с JSON пишется бинарный снапшот, из которого база поднимается при
+    старте намного быстрее. Если снапшот устарел или поврежден - читается JSON.
+    """
+
+    needs_snapshot = True
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.binary_path = binary_snapshot_path(path)
+        self.delta = DatabaseJournal(os.path.splitext(path)[0] + ".delta")
+        self.delta_max_ratio = DB_DELTA_MAX_RATIO
+        self.delta_max_records = DB_DELTA_MAX_RECORDS
+
+    def load(self) -> Dict[int, UserStat]:
+        data = self._load_snapshot()
+        applied = self.delta.replay(data)
+        if applied:
+            noFapLogger.info(f"📜 Replayed {applied} delta records")
+        return data
+
+    def _load_snapshot(self) -> Dict[int, UserStat]:
+        data = read_binary_snapshot(self.binary_path, self.path)
+        if data is not None:
+            noFapLogger.info(f"⚡ Loaded {len(data)} users from {self.binary_path}")
+            return data
+        if not os.path.exists(self.path):
+            return dict()
+        with open(self.path, "r") as f:
+            raw_data = json.load(f)
+        return {int(uid): UserStat.from_dict(user) for uid, user in raw_data.items()}
+
+    def wants_full_snapshot(self, dirty_count: int, total_count: int) -> bool:
+        if not os.path.exists(self.path):
+            return True
+        if dirty_count > total_count * self.delta_max_ratio:
+            return True
+        return self.delta.records_count + dirty_count > self.delta_max_records
+
+    def flush(
+        self, changed: Dict[int, UserStat], snapshot: Optional[Dict[int, UserStat]]
+    ) -> int:
+        # Дельта пишется и перед полным снапшотом: если процесс упадет после
+        # замены JSON, но до удаления дельты, её последние записи совпадут
+        # со снапшотом и повторное применение ничего не испортит
+        for user in changed.values():
+            self.delta.append({"op": "put", "uid": user.uid, "v": user})
+        written = self.delta.sync()
+        if snapshot is not None:
+            written += self._write_snapshot(snapshot)
+        return written
+
+    def _write_snapshot(self, snapshot: Dict[int, UserStat]) -> int:
+        written = write_json_atomic(self.path, snapshot)
+        written += write_binary_snapshot(self.binary_path, snapshot, self.path)
+        self.delta.clear()
+        return written
+
+    def close(self):
+        self.delta.close()
+
+    def begin_compaction(self) -> bool:
+        return self.delta.rotate()
+
+    def finish_compaction(self, snapshot: Dict[int, UserStat]):
+        # Дельта, записанная после ротации, остается и применяется поверх
+        write_json_atomic(self.path, snapshot)
+        write_binary_snapshot(self.binary_path, snapshot, self.path)
+        self.delta.drop_rotated()
+        noFapLogger.info(f"🗜️ Delta compacted into snapshot {self.path}")
+
+    def discard_changes(self):
+        self.delta.clear()
+
+
+class JournalStorage(JsonStorage):
+    """
+    JSON снапшот + append-only журнал изменений.
+
+    Каждая мутация дописывается в журнал компактной записью, поэтому стоимость
+    записи пропорциональна изменению, а не размеру базы. Журнал периодически
+    сворачивается в снапшот, при старте снапшот и журнал проигрываются заново.
+    """
+
+    needs_snapshot = False
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.journal = DatabaseJournal(os.path.splitext(path)[0] + ".journal")
+
+    def load(self) -> Dict[int, UserStat]:
+        data = super().load()
+        applied = self.journal.replay(data)
+        if applied:
+            noFapLogger.info(f"📜 Replayed {applied} journal records")
+        return data
+
+    def add_user(self, user: UserStat):
+        self.journal.append({"op": "new", "uid": user.uid, "v": user})
+
+    def set_field(self, uid: int, field: str, value):
+        self.journal.append({"op": "set", "uid": uid, "f": field, "v": value})
+
+    def add_meme(self, uid: int, index: int, meme: str):
+        self.journal.append({"op": "meme", "uid": uid, "i": index, "v": meme})
+
+    def wants_full_snapshot(self, dirty_count: int, total_count: int) -> bool:
+        return False
+
+    def flush(
+        self, changed: Dict[int, UserStat], snapshot: Optional[Dict[int, UserStat]]
+    ) -> int:
+        return self.journal.sync()
+
+    def close(self):
+        self.journal.close()
+        super().close()
+
+    def begin_compaction(self) -> bool:
+        return self.journal.rotate()
+
+    def finish_compaction(self, snapshot: Dict[int, UserStat]):
+        self._write_snapshot(snapshot)
+        self.journal.drop_rotated()
+        noFapLogger.info(f"🗜️ Journal compacted into snapshot {self.path}")
+
+    def discard_changes(self):
+        self.journal.clear()
+        super().discard_changes()
+
+
+def create_storage(backend: str, json_path: str, sqlite_path: str) -> Storage:
+    """
+    Создает движок хранения по имени из конфигурации.
+
+    Args:
+        backend: "json", "journal" или "sqlite"
+        json_path: Путь к JSON файлу базы (снапшот для json/journal, источник
+            миграции и экспорт для sqlite)
+        sqlite_path: Путь к файлу SQLite базы
+    """
+    if backend == "json":
+        return JsonStorage(json_path)
+    if backend == "journal":
+        return JournalStorage(json_path)
+    if backend == "sqlite":
+        from .sqlite_storage import SqliteStorage
+
+        return SqliteStorage(sqlite_path, json_path=json_path)
+    raise ValueError(f"Unknown database backend: {backend}")
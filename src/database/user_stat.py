@@ -1,12 +1,108 @@
-from dataclasses import dataclass
+from array import array
 from datetime import datetime
+from typing import Iterable, List, Optional
+
+import dateutil.parser
+
+from .meme_catalog import meme_catalog
+
+
+def parse_datetime(value) -> datetime:
+    """Быстрый разбор ISO даты с запасным вариантом через dateutil."""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.isoparse(value)
 
 
-@dataclass
 class UserStat:
-    uid: int
-    username: str
-    lastTimeFap: datetime
-    collectedMemes: list
-    isBlocked: bool
-    isWinner: bool
+    """
+    Запись пользователя.
+
+    Для экономии памяти класс использует __slots__, а собранные мемы хранятся
+    массивом id из общего справочника meme_catalog вместо списка строк.
+    """
+
+    __slots__ = ("uid", "username", "lastTimeFap", "memeIds", "isBlocked", "isWinner")
+
+    def __init__(
+        self,
+        uid: int,
+        username: str,
+        lastTimeFap: datetime,
+        collectedMemes: Iterable[str],
+        isBlocked: bool,
+        isWinner: bool,
+    ):
+        self.uid = uid
+        self.username = username
+        self.lastTimeFap = lastTimeFap
+        self.memeIds = array("H", map(meme_catalog.intern, collectedMemes))
+        self.isBlocked = isBlocked
+        self.isWinner = isWinner
+
+    @classmethod
+    def from_dict(cls, user_data: dict) -> "UserStat":
+        """Создает запись из формата JSON файла базы."""
+        return cls(
+            uid=user_data["uid"],
+            username=user_data["username"],
+            lastTimeFap=parse_datetime(user_data["lastTimeFap"]),
+            collectedMemes=user_data.get("collectedMemes", list()),
+            isBlocked=user_data.get("isBlocked", False),
+            isWinner=user_data.get("isWinner", False),
+        )
+
+    @property
+    def collectedMemes(self) -> List[str]:
+        return [meme_catalog.name(meme_id) for meme_id in self.memeIds]
+
+    @property
+    def lastMeme(self) -> Optional[str]:
+        if not self.memeIds:
+            return None
+        return meme_catalog.name(self.memeIds[-1])
+
+    def addMeme(self, meme: str) -> int:
+        """Добавляет мем и возвращает его позицию в списке собранных."""
+        self.memeIds.append(meme_catalog.intern(meme))
+        return len(self.memeIds) - 1
+
+    def setMeme(self, index: int, meme: str):
+        """Ставит мем на позицию index, отбрасывая все мемы после нее."""
+        del self.memeIds[index:]
+        self.addMeme(meme)
+
+    def copy(self) -> "UserStat":
+        stat = UserStat(
+            self.uid, self.username, self.lastTimeFap, (), self.isBlocked, self.isWinner
+        )
+        stat.memeIds = array("H", self.memeIds)
+        return stat
+
+    def to_dict(self) -> dict:
+        """Представление в формате JSON файла базы."""
+        return {
+            "uid": self.uid,
+            "username": self.username,
+            "lastTimeFap": self.lastTimeFap,
+            "collectedMemes": self.collectedMemes,
+            "isBlocked": self.isBlocked,
+            "isWinner": self.isWinner,
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, UserStat):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(uid={self.uid!r}, username={self.username!r}, "
+            f"lastTimeFap={self.lastTimeFap!r}, collectedMemes={self.collectedMemes!r}, "
+            f"isBlocked={self.isBlocked!r}, isWinner={self.isWinner!r})"
+        )
@@ -4,9 +4,14 @@ from aiogram import types
 
 from commands import commands
 from database import database
-from dispatcher import dp
+from dispatcher import concurrency_limiter, dp, rate_limiter
 from logger import noFapLogger
 from src.constants import LOGS_FOLDER
+from src.handlers.daily_actions import check_rating_stats
+from src.handlers.meme_actions import reload_memes
+from src.handlers.statistics import statistics_cache
+from src.utils.broadcast import DeliveryStatus, broadcaster
+from src.utils.chat_cache import chat_cache
 from src.utils.log_sender import send_logs
 from src.utils.scheduler_manager import update_logging_schedule
 
@@ -205,6 +210,119 @@ async def get_log_rotation_time(message: types.Message):
         await message.answer(f"❌ Ошибка при получении времени ротации: {e}")
 
 
+@dp.message_handler(is_admin=True, commands=["db_stats"])
+async def get_database_stats(message: types.Message):
+    """Показывает счётчики сохранений базы"""
+    stats = database.flush_stats.stats()
+    pages = statistics_cache.stats()
+    await message.answer(
+        f"💾 Сохранения базы ({database.storage.__class__.__name__}):\n"
+        f"• Пользователей: {len(database.data)}\n"
+        f"• Сохранений: {stats['flushes']} "
+        f"(полных снапшотов: {stats['full_snapshots']})\n"
+        f"• Пропущено без изменений: {stats['skipped']}\n"
+        f"• Изменённых пользователей за последнее: {stats['last_dirty_users']} "
+        f"(в среднем {stats['avg_dirty_users']:.1f})\n"
+        f"• Записано байт за последнее: {stats['last_bytes_written']} "
+        f"(в среднем {stats['avg_bytes_written']:.0f})\n\n"
+        f"📊 Кэш страниц статистики:\n"
+        f"• Попаданий: {pages['hits']}, промахов: {pages['misses']} "
+        f"({pages['hit_rate']:.1%})\n"
+        f"• Страниц в кэше: {pages['pages']}"
+    )
+
+
+@dp.message_handler(is_admin=True, commands=["api_stats"])
+async def get_api_stats(message: types.Message):
+    """Показывает счётчики обращений к Telegram API"""
+    stats = chat_cache.stats()
+    limits = rate_limiter.stats()
+    concurrency = concurrency_limiter.stats()
+    await message.answer(
+        f"📡 Кэш get_chat (TTL {chat_cache.ttl / 3600:g} ч):\n"
+        f"• Записей: {stats['size']} из {chat_cache.max_size}\n"
+        f"• Попаданий: {stats['hits']}, промахов: {stats['misses']}\n"
+        f"• Объединено параллельных запросов: {stats['coalesced']}\n"
+        f"• Вытеснено: {stats['evictions']}\n"
+        f"• Доля ответов без запроса к API: {stats['hit_rate']:.1%}\n\n"
+        f"⚖️ Одновременных запросов: лимит {concurrency['limit']} "
+        f"(в полете {concurrency['in_flight']}, ждут {concurrency['waiting']}; "
+        f"рост {concurrency['increases']}, снижение {concurrency['decreases']})\n\n"
+        f"🚦 Ограничитель отправки:\n"
+        f"• Отправлено: {limits['sent']}, ждали лимита: {limits['throttled']} "
+        f"(в среднем {limits['avg_wait']:.2f} с)\n"
+        f"• Пауз по RetryAfter: {limits['pauses']} "
+        f"(до конца текущей: {limits['paused_for']:.0f} с)\n"
+        f"• Чатов с активным лимитом: {limits['chat_buckets']}\n\n"
+        f"🩹 Пользователи с временными ошибками: {len(database.failures)}"
+    )
+
+
+@dp.message_handler(is_admin=True, commands=["sweep_stats"])
+async def get_sweep_stats(message: types.Message):
+    """Показывает счётчики проходов checkRating"""
+    stats = check_rating_stats.stats()
+    counts = stats["last_counts"]
+    running = (
+        f"идет {stats['running_for']:.0f} с"
+        if stats["running_for"] is not None
+        else "не идет"
+    )
+    await message.answer(
+        f"🔁 Проходы checkRating (сейчас {running}):\n"
+        f"• Проходов: {stats['runs']}, пропущено из-за наложения: {stats['overlaps']}\n"
+        f"• Длительность последнего: {stats['last_duration']:.1f} с "
+        f"(максимум {stats['max_duration']:.1f} с)\n"
+        f"• Обработано в последнем: {stats['last_users']} "
+        f"(в среднем {stats['avg_users']:.1f})\n"
+        f"• Статусы: {', '.join(f'{k}: {v}' for k, v in counts.items()) or '-'}\n"
+        f"• Упало с исключением за все проходы: {stats['crashes']}\n"
+        f"• Не уложились в бюджет: {stats['budget_exhausted']} раз, "
+        f"осталось в очереди: {stats['last_backlog']}\n"
+        f"• В очереди всего: {len(database.due_queue)}, "
+        f"ждут мемов: {database.due_queue.parked_count}"
+    )
+
+
+@dp.message_handler(is_admin=True, commands=["broadcasts"])
+async def get_broadcasts(message: types.Message):
+    """Показывает идущие рассылки"""
+    jobs = broadcaster.active_jobs()
+    if not jobs:
+        await message.answer("📨 Активных рассылок нет")
+        return
+    lines = ["📨 Активные рассылки:"]
+    for job in jobs:
+        counts = job.counts()
+        lines.append(
+            f"• {job.job_id}: осталось {len(job.pending())} из {len(job.recipients)}, "
+            f"доставлено {counts.get(DeliveryStatus.SENT.value, 0)}, "
+            f"ошибок {counts.get(DeliveryStatus.FAILED.value, 0)}"
+        )
+    await message.answer("\n".join(lines))
+
+
+@dp.message_handler(is_admin=True, commands=["reload_memes"])
+async def reload_memes_command(message: types.Message):
+    """Перечитывает папку мемов без перезапуска бота"""
+    changes = await reload_memes(force=True)
+    if changes is None:
+        await message.answer("⏳ Каталог мемов уже перечитывается, попробуйте позже")
+        return
+    text = (
+        f"🖼️ Каталог мемов перечитан:\n"
+        f"• Добавлено: {len(changes.added)}\n"
+        f"• Удалено: {len(changes.removed)}\n"
+        f"• Изменено: {len(changes.updated)}\n"
+        f"• Дней с мемами: {len(database.memes.days())}"
+    )
+    if changes.new_days:
+        text += f"\n🆕 Новые дни: {', '.join(map(str, changes.new_days))}"
+    if database.memes.malformed:
+        text += f"\n⚠️ Имена не по формату: {', '.join(database.memes.malformed)}"
+    await message.answer(text)
+
+
 @dp.message_handler(is_admin=True, commands=["admin_help"])
 async def admin_help(message: types.Message):
     """Показывает список всех админских команд"""
@@ -216,7 +334,13 @@ async def admin_help(message: types.Message):
         "📋 **Логи и мониторинг:**\n"
         "• `/get_logs` - получить текущий файл логов\n"
         "• `/set_log_time ЧЧ:ММ` - установить время ежедневной отправки логов (МСК)\n"
-        "• `/get_log_time` - показать текущее время отправки логов\n\n"
+        "• `/get_log_time` - показать текущее время отправки логов\n"
+        "• `/db_stats` - счётчики сохранений базы и кэша статистики\n"
+        "• `/api_stats` - счётчики кэша запросов к Telegram API\n"
+        "• `/broadcasts` - прогресс идущих рассылок\n"
+        "• `/sweep_stats` - счётчики проходов checkRating\n\n"
+        "🖼️ **Мемы:**\n"
+        "• `/reload_memes` - перечитать папку мемов без перезапуска\n\n"
         "ℹ️ **Справка:**\n"
         "• `/admin_help` - показать эту справку\n\n"
         "🌍 Время указывается по московскому часовому поясу (МСК)\n"
@@ -227,7 +351,17 @@ async def admin_help(message: types.Message):
 
 
 @dp.message_handler(
-    is_admin=False, commands=["set_log_time", "get_log_time", "admin_help"]
+    is_admin=False,
+    commands=[
+        "set_log_time",
+        "get_log_time",
+        "admin_help",
+        "db_stats",
+        "api_stats",
+        "broadcasts",
+        "sweep_stats",
+        "reload_memes",
+    ],
 )
 async def log_time_no_admin(message: types.Message):
     """Запрет доступа к командам управления временем ротации для не-админов"""
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from aiogram import types
 from aiogram.dispatcher.filters import Text
+from aiogram.dispatcher.webhook import SendMessage
 from aiogram_calendar import SimpleCalendar, simple_cal_callback
 
 from database import database
@@ -37,11 +38,15 @@ async def process_simple_calendar(
 
 @dp.message_handler(Text(equals=["Open Calendar", "Restart"], ignore_case=True))
 async def nav_cal_handler(message: types.Message):
-    await message.answer(
-        "Please select a date: ", reply_markup=await SimpleCalendar().start_calendar()
+    return SendMessage(
+        message.chat.id,
+        "Please select a date: ",
+        reply_markup=await SimpleCalendar().start_calendar(),
     )
 
 
 @dp.message_handler(Text("Not now"))
 async def start_challenge_now(message: types.Message):
-    await message.reply("Ok, you nofap challenge begin now.", reply_markup=menu_kb)
+    return SendMessage(
+        message.chat.id, "Ok, you nofap challenge begin now.", reply_markup=menu_kb
+    ).reply(message)
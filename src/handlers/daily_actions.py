@@ -1,37 +1,42 @@
 import asyncio
-import os
 import random
+import time
 from datetime import datetime
-from typing import Callable
+from typing import Callable, List, Optional
 
 from aiogram import types
 from aiogram.dispatcher.filters import Text
+from aiogram.dispatcher.webhook import SendMessage
 from aiogram.utils.exceptions import (
     BotBlocked,
     ChatNotFound,
+    NetworkError,
     RetryAfter,
     TelegramAPIError,
+    WrongFileIdentifier,
+    WrongRemoteFileIdSpecified,
 )
 
+from config.config import (
+    CHECK_RATING_TIME_BUDGET_SECONDS,
+    CHECK_RATING_USER_TIMEOUT_SECONDS,
+    RATE_LIMIT_MAX_RETRIES,
+    USERNAME_SILENCE_WINDOW_SECONDS,
+)
 from database import database
-from dispatcher import bot, dp
+from dispatcher import bot, concurrency_limiter, dp
 from logger import noFapLogger
+from src.database.due_queue import to_seconds
 from src.database.user_stat import UserStat
 from src.keyboard import menu_kb, reply_kb
-from src.utils.async_utils import UserProcessingStatus, run_with_semaphore
+from src.utils.async_utils import SweepStats, UserProcessingStatus, run_streaming
+from src.utils.broadcast import DeliveryStatus, broadcaster
+from src.utils.chat_cache import chat_cache
 
 random.seed(datetime.now().timestamp())
 
-# Кэш для проблемных пользователей, чтобы не проверять их слишком часто
-_problematic_users_cache = set()
-
-
-def clear_problematic_users_cache():
-    """Очищает кэш проблемных пользователей. Вызывается периодически."""
-    global _problematic_users_cache
-    cache_size = len(_problematic_users_cache)
-    _problematic_users_cache.clear()
-    noFapLogger.info(f"Cleared problematic users cache, removed {cache_size} entries")
+# Тип рассылки с ежедневным вопросом "Did you fap today?"
+DAILY_QUESTION = "daily_question"
 
 
 @dp.message_handler(Text(equals=["Yes!", "I'm guilty"], ignore_case=True))
@@ -43,7 +48,7 @@ async def fapping_reply(message: types.Message):
     uid = message.chat.id
     database.update(uid, datetime.now())
     database.user_contexts[uid].getting_response()
-    await message.reply(message_text, reply_markup=menu_kb)
+    return SendMessage(uid, message_text, reply_markup=menu_kb).reply(message)
 
 
 @dp.message_handler(Text("No!"))
@@ -54,13 +59,13 @@ async def fapping_reply(message: types.Message):
         message_text += "\n\nYou should set nickname for using our bot"
     uid = message.chat.id
     database.user_contexts[uid].getting_response()
-    await message.reply(message_text, reply_markup=menu_kb)
+    return SendMessage(uid, message_text, reply_markup=menu_kb).reply(message)
 
 
 async def sendMemeToUser(user: UserStat, new_day: int):
-    day_memes = database.cached_memes[new_day]
+    day_memes = database.memes.memes_for_day(new_day)
     new_meme = random.choice(day_memes)
-    user.collectedMemes.append(new_meme)
+    database.update(user.uid, collectedMeme=new_meme)
     noFapLogger.info(f"User {user.username}({user.uid}) gets meme {new_meme}")
 
     await send_message_safety(
@@ -71,62 +76,102 @@ async def sendMemeToUser(user: UserStat, new_day: int):
     await send_photo_safety(user.uid, new_meme)
 
 
-async def sendDailyQuestion(user: UserStat, actual_nick: str):
-    if user.uid in database.getBlackListUIDs():
-        noFapLogger.info(f'User: "{actual_nick}" has been banned by bot!')
-        return
+async def deliverDailyQuestion(uid: int) -> DeliveryStatus:
+    """Отправка ежедневного вопроса одному получателю рассылки."""
+    user = database.data.get(uid)
+    if user is None:
+        return DeliveryStatus.SKIPPED
+    if database.isUserBlocked(uid):
+        noFapLogger.info(f'User: "{user.username}" has been banned by bot!')
+        return DeliveryStatus.SKIPPED
     message = "Did you fap today?"
     noFapLogger.info(
-        f'Try to send check message: "{message}" to user {actual_nick}({user.uid})'
+        f'Try to send check message: "{message}" to user {user.username}({uid})'
     )
 
-    await send_message_safety(
-        user,
-        message,
-        reply_markup=reply_kb,
-        on_success=lambda: database.user_contexts[user.uid].daily_check(),
-    )
+    try:
+        await bot.send_message(uid, message, reply_markup=reply_kb)
+    except (BotBlocked, ChatNotFound) as err:
+        noFapLogger.error(f'"{err}" While sending to user {user.username}({uid})')
+        database.update(uid, bannedFlag=True)
+        chat_cache.invalidate(uid)
+        return DeliveryStatus.BLOCKED
+    except (RetryAfter, NetworkError, asyncio.TimeoutError) as err:
+        noFapLogger.warning(f'"{err}" While sending to user {user.username}({uid})')
+        return DeliveryStatus.RETRY
+    except TelegramAPIError as err:
+        noFapLogger.error(f'"{err}" While sending to user {user.username}({uid})')
+        return DeliveryStatus.FAILED
+    database.user_contexts[uid].daily_check()
+    return DeliveryStatus.SENT
 
 
-async def process_single_user(user: UserStat) -> UserProcessingStatus:
-    """Обработка одного пользователя. Возвращает статус обработки."""
-    days = (datetime.now() - user.lastTimeFap).days
+broadcaster.register(DAILY_QUESTION, deliverDailyQuestion)
 
-    if days < 0 or user.isBlocked:
-        return UserProcessingStatus.SKIPPED
 
-    # Пропускаем пользователей, которые недавно вызывали ошибки
-    if user.uid in _problematic_users_cache:
-        return UserProcessingStatus.SKIPPED
+async def refresh_username(user: UserStat) -> Optional[UserProcessingStatus]:
+    """
+    Обновляет ник через get_chat.
 
+    Returns:
+        None при успехе или статус, с которым нужно завершить обработку
+    """
     # Безопасное получение информации о чате с обработкой ошибок
     try:
-        chat = await bot.get_chat(user.uid)
+        chat = await chat_cache.get(user.uid)
         actual_nick = chat.username
-        database.update(user.uid, newNickName=actual_nick)
+        if actual_nick:
+            database.update(user.uid, newNickName=actual_nick)
     except (ChatNotFound, BotBlocked) as err:
         noFapLogger.warning(
             f"User {user.username}({user.uid}) is not accessible: {err}. Marking as blocked."
         )
         database.update(user.uid, bannedFlag=True)
-        _problematic_users_cache.add(user.uid)
         return UserProcessingStatus.BLOCKED
     except TelegramAPIError as err:
         noFapLogger.error(
             f"Telegram API error for user {user.username}({user.uid}): {err}. Skipping this user."
         )
-        _problematic_users_cache.add(user.uid)
+        database.failures.record_failure(user.uid, str(err))
         return UserProcessingStatus.ERROR
+    database.failures.forget(user.uid)
+    return None
+
+
+async def process_single_user(
+    user: UserStat, daily_questions: List[int]
+) -> UserProcessingStatus:
+    """
+    Обработка одного пользователя. Возвращает статус обработки.
+
+    Ежедневный вопрос не отправляется сразу: uid добавляется в daily_questions,
+    и checkRating отправляет их одной рассылкой.
+    """
+    days = (datetime.now() - user.lastTimeFap).days
+
+    if days < 0 or user.isBlocked:
+        return UserProcessingStatus.SKIPPED
+
+    # Пропускаем пользователей, которые недавно вызывали ошибки
+    if database.failures.is_backing_off(user.uid):
+        return UserProcessingStatus.SKIPPED
+
+    # Ник активных пользователей обновляет UsernameTrackingMiddleware,
+    # get_chat нужен только для тех, кто давно ничего не присылал
+    if database.isSilent(user.uid, USERNAME_SILENCE_WINDOW_SECONDS):
+        status = await refresh_username(user)
+        if status is not None:
+            return status
 
     new_day = 0
     last_day = 0
-    if len(user.collectedMemes) != 0:
-        last_day = int(user.collectedMemes[-1].split()[1].split("_")[0])
+    if user.lastMeme is not None:
+        last_day = database.memes.day_of(user.lastMeme) or 0
         new_day = min(last_day + 1, days)
         if last_day == new_day:
             return UserProcessingStatus.SKIPPED
 
-    if new_day in database.cached_memes:
+    if database.memes.has_day(new_day):
         database.update(user.uid, winnerFlag=False)
         await sendMemeToUser(user, new_day)
     elif not user.isWinner:
@@ -138,34 +183,110 @@ async def process_single_user(user: UserStat) -> UserProcessingStatus:
         return UserProcessingStatus.SKIPPED
 
     if days - last_day == 1:
-        await sendDailyQuestion(user, actual_nick)
+        daily_questions.append(user.uid)
 
     return UserProcessingStatus.PROCESSED
 
 
-async def checkRating():
-    users_count = len(database.data)
-    noFapLogger.info(f"Starting async checkRating for {users_count} users")
+check_rating_stats = SweepStats()
+
 
-    if users_count == 0:
-        noFapLogger.info("No users in database, skipping checkRating")
+async def checkRating():
+    """
+    Обрабатывает пользователей, у которых наступила граница дня.
+
+    Пользователи берутся из due_queue по одному, от самых давних, пока не
+    кончится бюджет времени CHECK_RATING_TIME_BUDGET_SECONDS. Необработанные
+    остаются в очереди, и следующий запуск продолжает с них - очередь и есть
+    курсор прохода. Пока идет один проход, новые не запускаются.
+    """
+    if check_rating_stats.running_since is not None:
+        check_rating_stats.overlaps += 1
+        noFapLogger.warning(
+            "checkRating is still running "
+            f"({time.monotonic() - check_rating_stats.running_since:.0f}s), skipping tick"
+        )
+        return
+    next_due = database.due_queue.next_due()
+    if next_due is None or next_due > to_seconds(datetime.now()):
         return
 
-    # Создаем задачи для параллельной обработки пользователей
-    tasks = [process_single_user(user) for user in database.data.values()]
+    started = time.monotonic()
+    check_rating_stats.running_since = started
+    try:
+        await _run_check_rating(started + CHECK_RATING_TIME_BUDGET_SECONDS)
+    finally:
+        check_rating_stats.running_since = None
+
+
+async def _run_check_rating(deadline: float):
+    started = time.monotonic()
+    now_seconds = to_seconds(datetime.now())
+    noFapLogger.info(
+        f"Starting async checkRating ({len(database.data)} total, "
+        f"{database.due_queue.parked_count} parked winners, "
+        f"{database.getBlackListSize()} blocked)"
+    )
+
+    popped = list()
+
+    async def due_uids():
+        # Новых пользователей не берем после дедлайна, начатые дорабатываются
+        while time.monotonic() < deadline:
+            uid = database.due_queue.pop_next(now_seconds)
+            if uid is None:
+                return
+            popped.append(uid)
+            yield uid
+
+    daily_questions = list()
 
-    # Выполняем все задачи параллельно с ограничением (max 10 одновременно)
-    results = await run_with_semaphore(tasks, max_concurrent=10)
+    async def process_uid(uid: int) -> UserProcessingStatus:
+        user = database.data.get(uid)
+        if user is None:
+            return UserProcessingStatus.SKIPPED
+        return await process_single_user(user, daily_questions)
 
-    # Подсчитываем статистику
-    processed_users = results.count(UserProcessingStatus.PROCESSED)
-    blocked_users = results.count(UserProcessingStatus.BLOCKED)
-    error_users = results.count(UserProcessingStatus.ERROR)
-    skipped_users = results.count(UserProcessingStatus.SKIPPED)
+    try:
+        # Пул воркеров берет пользователей по одному: в памяти не больше
+        # CONCURRENCY_MAX задач, параллельность задает общий адаптивный лимит
+        counts = await run_streaming(
+            due_uids(),
+            process_uid,
+            concurrency_limiter,
+            workers=concurrency_limiter.maximum,
+            timeout=CHECK_RATING_USER_TIMEOUT_SECONDS,
+        )
+    finally:
+        # Возвращаем всех в очередь, даже если обработка упала. Проблемные
+        # пользователи встают не раньше своего времени повтора из database.failures
+        for uid in popped:
+            database.rescheduleUser(uid)
+        await database.saveFailures()
+        # file_id мемов, загруженных за проход
+        await database.memes.flush()
+
+    if daily_questions:
+        await broadcaster.start(DAILY_QUESTION, daily_questions)
 
     database.update()
+
+    # Очередь считаем, только если бюджета не хватило - это проход по всей базе
+    next_due = database.due_queue.next_due()
+    backlog = 0
+    if next_due is not None and next_due <= now_seconds:
+        backlog = database.due_queue.count_due(now_seconds)
+    duration = time.monotonic() - started
+    check_rating_stats.record(duration, counts, backlog)
+
     noFapLogger.info(
-        f"Async checkRating completed: {processed_users} processed, {blocked_users} blocked, {error_users} errors, {skipped_users} skipped"
+        f"Async checkRating completed in {duration:.1f}s: "
+        f"{counts[UserProcessingStatus.PROCESSED]} processed, "
+        f"{counts[UserProcessingStatus.BLOCKED]} blocked, "
+        f"{counts[UserProcessingStatus.ERROR]} errors, "
+        f"{counts[UserProcessingStatus.SKIPPED]} skipped, "
+        f"{counts[UserProcessingStatus.CRASHED]} crashed"
+        + (f", {backlog} left for the next tick" if backlog else "")
     )
 
 
@@ -176,29 +297,64 @@ async def send_message_safety(
     try:
         await bot.send_message(chat_id, message, reply_markup=reply_markup)
         on_success()
-    except (BotBlocked, ChatNotFound) as err:
-        noFapLogger.error(f'"{err}" While sending to user {user.username}({user.uid})')
-        database.update(chat_id, bannedFlag=True)
-    except RetryAfter as err:
-        noFapLogger.error(f'"{err}" While sending to user {user.username}({user.uid})')
-        await asyncio.sleep(err.timeout)
-        return await send_message_safety(user, message, reply_markup, on_success)
     except TelegramAPIError as err:
         noFapLogger.error(f'"{err}" While sending to user {user.username}({user.uid})')
+        record_send_failure(chat_id, err)
+
+
+def record_send_failure(chat_id: int, err: Exception):
+    """Блокирует недоступный чат, остальные ошибки откладывают пользователя."""
+    if isinstance(err, (BotBlocked, ChatNotFound)):
+        database.update(chat_id, bannedFlag=True)
+        chat_cache.invalidate(chat_id)
+    else:
+        database.failures.record_failure(chat_id, str(err))
 
 
 async def send_photo_safety(chat_id: int, file_name: str):
-    with open(os.path.join("storage", "memes", file_name), "rb") as meme_pic:
+    file_id = await database.memes.file_id(file_name)
+    if file_id is not None:
         try:
-            await bot.send_photo(chat_id, meme_pic)
+            await bot.send_photo(chat_id, file_id)
+            return
+        except (WrongFileIdentifier, WrongRemoteFileIdSpecified) as exc:
+            # file_id протух (например, сменился токен бота) - загружаем заново
+            noFapLogger.warning(f'"{exc}" while sending cached meme {file_name}')
+            database.memes.set_file_id(file_name, None)
         except Exception as exc:
             noFapLogger.error(f'"{exc}" while sending meme to user {chat_id}')
+            record_send_failure(chat_id, exc)
+            return
+
+    for _ in range(RATE_LIMIT_MAX_RETRIES + 1):
+        # open внутри try: пропавший файл мема - ошибка одного пользователя
+        try:
+            with open(database.memes.path(file_name), "rb") as meme_pic:
+                sent = await bot.send_photo(chat_id, meme_pic)
+            break
+        except RetryAfter:
+            # Бот уже приостановил отправку, файл нужно загрузить заново
+            continue
+        except Exception as exc:
+            noFapLogger.error(f'"{exc}" while sending meme to user {chat_id}')
+            record_send_failure(chat_id, exc)
+            return
+    else:
+        noFapLogger.error(
+            f"❌ Giving up sending meme {file_name} to user {chat_id}: "
+            f"flood control after {RATE_LIMIT_MAX_RETRIES} retries"
+        )
+        return
+    if sent.photo:
+        database.memes.set_file_id(file_name, sent.photo[-1].file_id)
 
 
 async def sendCheckMessageToWinners():
     noFapLogger.info("Send broadcast message for winners")
-    for uid in database.data:
-        user = database.data[uid]
-        if not user.isWinner:
-            continue
-        await sendDailyQuestion(user, user.username)
+    winners = [
+        uid
+        for uid, user in database.data.items()
+        if user.isWinner and not user.isBlocked
+    ]
+    if winners:
+        await broadcaster.start(DAILY_QUESTION, winners, notify_admins=True)
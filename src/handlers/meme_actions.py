@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 from aiogram import types
 from aiogram.dispatcher import FSMContext
@@ -6,7 +7,11 @@ from aiogram.dispatcher.filters import Text
 from aiogram.dispatcher.filters.state import State, StatesGroup
 
 from commands import commands
+from database import database
 from dispatcher import bot, dp
+from logger import noFapLogger
+from src.database.meme_catalog import CatalogChanges
+from src.utils.meme_warmup import start_meme_warmup
 
 
 class SuggestMeme(StatesGroup):
@@ -50,3 +55,28 @@ async def processSuggestedMeme(message: types.Message, state: FSMContext):
                         Tell your friends about it!\nhttps://t.me/nofap_challenge_bot"
     )
     await state.finish()
+
+
+async def reload_memes(force: bool = False) -> Optional[CatalogChanges]:
+    """
+    Подхватывает изменения в папке мемов без перезапуска бота.
+
+    Победители, ждущие мемов нового дня, получат их на ближайшем checkRating.
+    """
+    changes = await database.memes.reload(force)
+    if not changes:
+        return changes
+
+    noFapLogger.info(
+        f"🖼️ Meme catalog reloaded: {len(changes.added)} added, "
+        f"{len(changes.removed)} removed, {len(changes.updated)} updated"
+    )
+    if changes.new_days:
+        unparked = database.unparkWinners()
+        noFapLogger.info(
+            f"🆕 Memes for new days {changes.new_days}, "
+            f"{unparked} waiting winners will be checked on next checkRating"
+        )
+    if changes.added or changes.updated:
+        start_meme_warmup(database.memes)
+    return changes
@@ -1,36 +1,64 @@
-from datetime import datetime
-from typing import List, Tuple
+from datetime import datetime, timedelta
+from typing import List
 
 from aiogram import types
 from aiogram.dispatcher.filters import Text
+from aiogram.dispatcher.webhook import SendMessage
 
 from commands import commands
 from database import database
 from dispatcher import bot, dp
+from src.database.user_stat import UserStat
 from src.keyboard import choosepage_cb, getInlineSlider
+from src.utils.page_cache import PageCache
 
+statistics_cache = PageCache()
 
-def make_statistics_message(topListPart: List, callerStat: Tuple, page: int) -> str:
-    return (
-        f"Statistics ({page*10 + 1}-{(page + 1)*10}):\n"
-        + "\n".join(
-            [
-                f"{page*10 + i + 1}. @{topListPart[i].username} Stat: {datetime.now() - topListPart[i].lastTimeFap}"
-                for i in range(len(topListPart))
-            ]
-        )
-        + f"\n...\n{callerStat[0]}. @{callerStat[1].username} Stat: {datetime.now() - callerStat[1].lastTimeFap}"
+
+def format_stat(now: datetime, lastTimeFap: datetime) -> str:
+    """Длительность воздержания с точностью до минуты."""
+    minutes = int((now - lastTimeFap).total_seconds() // 60)
+    return str(timedelta(minutes=minutes))
+
+
+def render_top_rows(topListPart: List[UserStat], page: int, now: datetime) -> str:
+    return "\n".join(
+        [
+            f"{page*10 + i + 1}. @{topListPart[i].username} Stat: {format_stat(now, topListPart[i].lastTimeFap)}"
+            for i in range(len(topListPart))
+        ]
     )
 
 
+def make_statistics_message(page: int, caller: int) -> str:
+    # Все строки считаются от начала текущей минуты, поэтому страница
+    # остается валидной до конца минуты или до изменения статистики
+    now = datetime.now().replace(second=0, microsecond=0)
+    callerStat = database.getCallerStat(caller)
+
+    if callerStat is not None and int(caller) not in database.leaderboard:
+        # Пользователь без ника видит себя в общей таблице - страница личная
+        topListPart, _ = database.getTop(page=page, caller=caller)
+        rows = render_top_rows(topListPart, page, now)
+    else:
+        rows = statistics_cache.get(
+            page,
+            (database.leaderboard_version, now),
+            lambda: render_top_rows(database.getTop(page=page)[0], page, now),
+        )
+
+    message = f"Statistics ({page*10 + 1}-{(page + 1)*10}):\n" + rows
+    if callerStat is not None:
+        message += f"\n...\n{callerStat[0]}. @{callerStat[1].username} Stat: {format_stat(now, callerStat[1].lastTimeFap)}"
+    return message
+
+
 @dp.message_handler(Text("Statistics"))
 @dp.message_handler(commands=[commands.StatisticsCommand])
 async def show_stats(message: types.Message):
-    top10List, callerStat = database.getTop(caller=message.chat.id)
-
-    await bot.send_message(
+    return SendMessage(
         message.chat.id,
-        make_statistics_message(top10List, callerStat, 0),
+        make_statistics_message(0, message.chat.id),
         reply_markup=getInlineSlider(0, message.chat.id),
     )
 
@@ -38,11 +66,8 @@ async def show_stats(message: types.Message):
 @dp.callback_query_handler(choosepage_cb.filter(direction="next"))
 async def handle_next_page(query: types.CallbackQuery, callback_data: dict):
     next_page = int(callback_data["page"]) + 1
-    topListPart, callerStat = database.getTop(
-        page=next_page, caller=callback_data["caller"]
-    )
     await bot.edit_message_text(
-        make_statistics_message(topListPart, callerStat, next_page),
+        make_statistics_message(next_page, callback_data["caller"]),
         query.message.chat.id,
         query.message.message_id,
         reply_markup=getInlineSlider(next_page, callback_data["caller"]),
@@ -54,11 +79,8 @@ async def handle_prev_page(query: types.CallbackQuery, callback_data: dict):
     prev_page = int(callback_data["page"]) - 1
     if prev_page < 0:
         return
-    topListPart, callerStat = database.getTop(
-        page=prev_page, caller=callback_data["caller"]
-    )
     await bot.edit_message_text(
-        make_statistics_message(topListPart, callerStat, prev_page),
+        make_statistics_message(prev_page, callback_data["caller"]),
         query.message.chat.id,
         query.message.message_id,
         reply_markup=getInlineSlider(prev_page, callback_data["caller"]),
@@ -12,7 +12,7 @@ class BlackListMiddleware(BaseMiddleware):
         super(BlackListMiddleware, self).__init__()
 
     async def on_process_message(self, message: types.Message, data: dict):
-        if message.chat.id in database.getBlackListUIDs():
+        if database.isUserBlocked(message.chat.id):
             userStat = database.getStatById(message.chat.id)
             await message.answer(
                 "Your statistics: \n"
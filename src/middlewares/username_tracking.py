@@ -0,0 +1,37 @@
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from database import database
+from logger import noFapLogger
+
+
+class UsernameTrackingMiddleware(BaseMiddleware):
+    """
+    Берет ник пользователя из входящих сообщений и нажатий кнопок, чтобы не
+    опрашивать get_chat для тех, кто и так пишет боту.
+    """
+
+    def __init__(self):
+        super(UsernameTrackingMiddleware, self).__init__()
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        if message.chat.type == types.ChatType.PRIVATE:
+            self._track(message.chat.id, message.chat.username)
+
+    async def on_process_callback_query(self, query: types.CallbackQuery, data: dict):
+        # uid в базе - id личного чата, он совпадает с id пользователя
+        self._track(query.from_user.id, query.from_user.username)
+
+    @staticmethod
+    def _track(uid: int, username: str):
+        old_username = database.getStatById(uid).username if uid in database else None
+        if database.seenUser(uid, username):
+            noFapLogger.info(
+                f"👤 User {uid} changed nick: {old_username} -> {username}"
+            )
+            # chat_cache создается от бота из dispatcher, который сам импортирует
+            # этот модуль, поэтому импорт здесь, а не на уровне модуля
+            from src.utils.chat_cache import chat_cache
+
+            # Закэшированный get_chat хранит старый ник
+            chat_cache.invalidate(uid)
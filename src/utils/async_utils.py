@@ -1,6 +1,20 @@
 import asyncio
+import time
+from collections import Counter, deque
 from enum import Enum
-from typing import Any, List
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Iterable,
+    Optional,
+    Union,
+)
+
+from logger import noFapLogger
 
 
 class UserProcessingStatus(Enum):
@@ -10,23 +24,236 @@ class UserProcessingStatus(Enum):
     BLOCKED = "blocked"
     ERROR = "error"
     SKIPPED = "skipped"
+    # Обработка упала с непредвиденным исключением
+    CRASHED = "crashed"
+
+
+class SweepStats:
+    """Счётчики проходов checkRating: длительность, обработанные и очередь."""
+
+    def __init__(self):
+        self.runs = 0
+        self.overlaps = 0
+        self.budget_exhausted = 0
+        self.crashes = 0
+        self.running_since: Optional[float] = None
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.last_users = 0
+        self.total_users = 0
+        self.last_backlog = 0
+        self.last_counts: Counter = Counter()
 
+    def record(self, duration: float, counts: Counter, backlog: int):
+        self.runs += 1
+        if backlog:
+            self.budget_exhausted += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_users = sum(counts.values())
+        self.total_users += self.last_users
+        self.last_backlog = backlog
+        self.last_counts = counts
+        self.crashes += counts[UserProcessingStatus.CRASHED]
 
-async def run_with_semaphore(tasks: List[Any], max_concurrent: int = 10) -> List[Any]:
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "overlaps": self.overlaps,
+            "budget_exhausted": self.budget_exhausted,
+            "crashes": self.crashes,
+            "running_for": (
+                time.monotonic() - self.running_since
+                if self.running_since is not None
+                else None
+            ),
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "last_users": self.last_users,
+            "avg_users": self.total_users / self.runs if self.runs else 0.0,
+            "last_backlog": self.last_backlog,
+            "last_counts": {
+                status.value: count for status, count in self.last_counts.items()
+            },
+        }
+
+
+class AdaptiveConcurrencyLimiter:
     """
-    Выполняет список задач с ограничением на количество одновременных выполнений.
+    Ограничение числа одновременных запросов по схеме AIMD.
+
+    Пока запросы к API проходят быстрее target_latency, лимит растет примерно
+    на increase за каждые limit успешных запросов. При перегрузке (RetryAfter,
+    5xx, сетевые ошибки) или медленном ответе лимит умножается на backoff,
+    но не чаще раза в cooldown секунд: одна перегрузка обычно роняет сразу
+    все запросы в полете.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        increase: float = 1.0,
+        backoff: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.target_latency = target_latency
+        self.increase = increase
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self):
+        if not self._waiters and self._in_flight < self.current_limit:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Слот успели выдать, но ждущего отменили - возвращаем слот
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def on_success(self, latency: float):
+        if latency > self.target_latency:
+            self.on_overload()
+            return
+        if self.limit < self.maximum:
+            before = self.current_limit
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            if self.current_limit > before:
+                self.increases += 1
+                self._wake()
+
+    def on_overload(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        limit = max(self.minimum, self.limit * self.backoff)
+        if limit < self.limit:
+            self.limit = limit
+            self.decreases += 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.current_limit,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+async def _as_async_iterator(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_streaming(
+    items: Union[Iterable, AsyncIterable],
+    handler: Callable[[Any], Awaitable[Any]],
+    limiter: AdaptiveConcurrencyLimiter,
+    workers: int,
+    timeout: Optional[float] = None,
+    timeout_result: Any = UserProcessingStatus.ERROR,
+    error_result: Any = UserProcessingStatus.CRASHED,
+) -> Counter:
+    """
+    Обрабатывает элементы пулом из workers воркеров, беря их по одному.
+
+    Корутина handler создается только для взятого в работу элемента, поэтому
+    память занимают не более workers задач, сколько бы ни было элементов.
+    Одновременно выполняется не больше, чем разрешает limiter. Исключение
+    из handler пишется в лог и засчитывается как error_result, остальные
+    элементы обрабатываются дальше. Отмена run_streaming отменяет все воркеры.
 
     Args:
-        tasks: Список корутин для выполнения
-        max_concurrent: Максимальное количество одновременных задач
+        items: Элементы (обычный или асинхронный итератор), читаются лениво
+        handler: Обработка одного элемента, возвращает статус
+        limiter: Общий ограничитель одновременных запросов к API
+        workers: Сколько воркеров держать (верхняя граница параллельности)
+        timeout: Ограничение времени на один элемент в секундах
+        timeout_result: Статус, который засчитывается при таймауте
+        error_result: Статус, который засчитывается при исключении из handler
 
     Returns:
-        Список результатов выполнения задач
+        Counter: Сколько раз handler вернул каждый статус
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
+    iterator = _as_async_iterator(items)
+    # Асинхронный генератор нельзя продвигать из двух воркеров одновременно
+    iterator_lock = asyncio.Lock()
+    counts = Counter()
 
-    async def limited_process(task: Any) -> Any:
-        async with semaphore:
-            return await task
+    async def worker():
+        while True:
+            # Элемент берется только со слотом на руках: пока лимит занят,
+            # итератор не продвигается
+            async with limiter:
+                async with iterator_lock:
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                try:
+                    result = await asyncio.wait_for(handler(item), timeout)
+                except asyncio.TimeoutError:
+                    result = timeout_result
+                except Exception as exc:
+                    noFapLogger.error(f"❌ Failed to process {item!r}: {exc!r}")
+                    result = error_result
+            counts[result] += 1
 
-    return await asyncio.gather(*[limited_process(task) for task in tasks])
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        await iterator.aclose()
+    return counts
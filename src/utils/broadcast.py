@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from config.config import (
+    ADMINS,
+    BROADCAST_CHECKPOINT_SECONDS,
+    BROADCAST_MAX_ATTEMPTS,
+    BROADCAST_RETRY_DELAY_SECONDS,
+)
+from dispatcher import bot, concurrency_limiter
+from logger import noFapLogger
+from src.utils.async_utils import AdaptiveConcurrencyLimiter, run_streaming
+from src.utils.json_encoder import write_json_atomic
+
+
+class DeliveryStatus(Enum):
+    """Статус доставки одному получателю рассылки"""
+
+    PENDING = "pending"
+    SENT = "sent"
+    # Временная ошибка - попробовать позже
+    RETRY = "retry"
+    # Пользователь заблокировал бота или удален
+    BLOCKED = "blocked"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+
+# Отправка одному получателю: uid -> итоговый статус (RETRY - повторить позже)
+Deliver = Callable[[int], Awaitable[DeliveryStatus]]
+
+
+class BroadcastJob:
+    """Рассылка: кому и что отправить и как дела у каждого получателя."""
+
+    def __init__(
+        self,
+        job_id: str,
+        kind: str,
+        created_at: datetime,
+        recipients: Dict[int, List],
+        notify_admins: bool = False,
+        finished_at: Optional[datetime] = None,
+    ):
+        self.job_id = job_id
+        self.kind = kind
+        self.created_at = created_at
+        # uid -> [статус, число попыток]
+        self.recipients = recipients
+        self.notify_admins = notify_admins
+        self.finished_at = finished_at
+
+    @classmethod
+    def create(cls, kind: str, uids: Iterable[int], notify_admins: bool):
+        job_id = f"{kind}-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        recipients = {uid: [DeliveryStatus.PENDING.value, 0] for uid in uids}
+        return cls(job_id, kind, datetime.now(), recipients, notify_admins)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BroadcastJob":
+        finished_at = data.get("finished_at")
+        return cls(
+            data["job_id"],
+            data["kind"],
+            datetime.fromisoformat(data["created_at"]),
+            {int(uid): state for uid, state in data["recipients"].items()},
+            data.get("notify_admins", False),
+            datetime.fromisoformat(finished_at) if finished_at else None,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "notify_admins": self.notify_admins,
+            "recipients": self.recipients,
+        }
+
+    def pending(self) -> List[int]:
+        return [
+            uid
+            for uid, (status, _) in self.recipients.items()
+            if status in (DeliveryStatus.PENDING.value, DeliveryStatus.RETRY.value)
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict()
+        for status, _ in self.recipients.values():
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+class Broadcaster:
+    """
+    Рассылки с сохраняемым на диск outbox.
+
+    Каждая рассылка лежит отдельным файлом в папке outbox и периодически
+    сохраняется вместе со статусами получателей, поэтому после перезапуска
+    она продолжается с того места, где остановилась. После падения повторно
+    могут уйти только сообщения, отправленные с последнего сохранения.
+    Временные ошибки повторяются с экспоненциальной паузой.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        limiter: AdaptiveConcurrencyLimiter,
+        max_attempts: int,
+        retry_delay: float,
+        checkpoint_interval: float,
+    ):
+        self.folder = folder
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.checkpoint_interval = checkpoint_interval
+        self._senders: Dict[str, Deliver] = dict()
+        self._jobs: Dict[str, BroadcastJob] = dict()
+        self._tasks: Dict[str, asyncio.Task] = dict()
+
+    def register(self, kind: str, deliver: Deliver):
+        self._senders[kind] = deliver
+
+    def active_jobs(self) -> List[BroadcastJob]:
+        return list(self._jobs.values())
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.folder, f"{job_id}.json")
+
+    async def start(
+        self, kind: str, uids: Iterable[int], notify_admins: bool = False
+    ) -> BroadcastJob:
+        """Сохраняет новую рассылку и запускает ее доставку в фоне."""
+        if kind not in self._senders:
+            raise ValueError(f"Unknown broadcast kind: {kind}")
+        job = BroadcastJob.create(kind, uids, notify_admins)
+        await self._save(job)
+        noFapLogger.info(
+            f"📨 Broadcast {job.job_id} started for {len(job.recipients)} users"
+        )
+        self._spawn(job)
+        return job
+
+    def resume(self) -> int:
+        """Продолжает незавершенные рассылки из outbox. Вызывается при старте."""
+        if not os.path.isdir(self.folder):
+            return 0
+        resumed = 0
+        for file_name in sorted(os.listdir(self.folder)):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.folder, file_name)
+            try:
+                with open(path, "r") as f:
+                    job = BroadcastJob.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                noFapLogger.error(f"❌ Failed to read broadcast {file_name}: {e}")
+                continue
+            if job.job_id in self._jobs:
+                continue
+            if job.kind not in self._senders:
+                noFapLogger.error(f"❌ Broadcast {job.job_id} has unknown kind")
+                continue
+            noFapLogger.info(
+                f"📨 Resuming broadcast {job.job_id}: "
+                f"{len(job.pending())}/{len(job.recipients)} left"
+            )
+            self._spawn(job)
+            resumed += 1
+        return resumed
+
+    def _spawn(self, job: BroadcastJob):
+        self._jobs[job.job_id] = job
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: BroadcastJob):
+        deliver = self._senders[job.kind]
+        last_checkpoint = time.monotonic()
+        try:
+            attempt_round = 0
+            while True:
+                pending = job.pending()
+                if not pending:
+                    break
+                if attempt_round:
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt_round - 1))
+                attempt_round += 1
+
+                async def deliver_and_record(uid: int) -> DeliveryStatus:
+                    nonlocal last_checkpoint
+                    status = await self._deliver_one(deliver, uid)
+                    self._record(job, uid, status)
+                    if time.monotonic() - last_checkpoint > self.checkpoint_interval:
+                        last_checkpoint = time.monotonic()
+                        await self._save(job)
+                    return status
+
+                await run_streaming(
+                    pending,
+                    deliver_and_record,
+                    self.limiter,
+                    workers=min(self.limiter.maximum, len(pending)),
+                )
+                await self._save(job)
+
+            job.finished_at = datetime.now()
+            await self._finish(job)
+        except asyncio.CancelledError:
+            # Остановка бота: сохраняем прогресс, доставка продолжится при старте
+            await self._save(job)
+            raise
+        finally:
+            self._jobs.pop(job.job_id, None)
+            self._tasks.pop(job.job_id, None)
+
+    @staticmethod
+    async def _deliver_one(deliver: Deliver, uid: int) -> DeliveryStatus:
+        try:
+            return await deliver(uid)
+        except Exception as e:
+            noFapLogger.error(f"❌ Broadcast delivery to {uid} failed: {e}")
+            return DeliveryStatus.RETRY
+
+    def _record(self, job: BroadcastJob, uid: int, status: DeliveryStatus):
+        state = job.recipients[uid]
+        state[1] += 1
+        if status == DeliveryStatus.RETRY and state[1] >= self.max_attempts:
+            status = DeliveryStatus.FAILED
+        state[0] = status.value
+
+    async def _save(self, job: BroadcastJob):
+        os.makedirs(self.folder, exist_ok=True)
+        # Снимок статусов: доставка продолжается, пока файл пишется в потоке
+        data = job.to_dict()
+        data["recipients"] = {uid: list(state) for uid, state in job.recipients.items()}
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                None, write_json_atomic, self._path(job.job_id), data
+            )
+        except OSError as e:
+            noFapLogger.error(f"❌ Failed to save broadcast {job.job_id}: {e}")
+
+    async def _finish(self, job: BroadcastJob):
+        counts = job.counts()
+        duration = job.finished_at - job.created_at
+        report = (
+            f"📨 Рассылка {job.job_id} завершена за {duration}:\n"
+            f"• Получателей: {len(job.recipients)}\n"
+            f"• Доставлено: {counts.get(DeliveryStatus.SENT.value, 0)}\n"
+            f"• Заблокировали бота: {counts.get(DeliveryStatus.BLOCKED.value, 0)}\n"
+            f"• Пропущено: {counts.get(DeliveryStatus.SKIPPED.value, 0)}\n"
+            f"• Ошибки: {counts.get(DeliveryStatus.FAILED.value, 0)}"
+        )
+        noFapLogger.info(report.replace("\n", " "))
+        if job.notify_admins:
+            for admin in ADMINS:
+                try:
+                    await bot.send_message(admin, report)
+                except Exception as e:
+                    noFapLogger.error(f"❌ Ошибка отправки отчета админу {admin}: {e}")
+        try:
+            os.remove(self._path(job.job_id))
+        except OSError as e:
+            noFapLogger.warning(f"⚠️ Failed to remove broadcast file: {e}")
+
+    async def close(self):
+        """Останавливает доставку, сохранив прогресс всех рассылок."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+broadcaster = Broadcaster(
+    os.path.join("storage", "outbox"),
+    concurrency_limiter,
+    BROADCAST_MAX_ATTEMPTS,
+    BROADCAST_RETRY_DELAY_SECONDS,
+    BROADCAST_CHECKPOINT_SECONDS,
+)
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from config.config import CHAT_CACHE_MAX_SIZE, CHAT_CACHE_TTL_SECONDS
+from dispatcher import bot
+
+
+class ChatInfoCache:
+    """
+    Кэш ответов get_chat с TTL на запись и ограничением размера (LRU).
+
+    Одновременные запросы одного и того же чата объединяются в один вызов
+    API. Ошибки не кэшируются: их получают все ожидающие, а следующий запрос
+    снова пойдет в API.
+    """
+
+    def __init__(
+        self, fetch: Callable[[int], Awaitable[Any]], ttl: float, max_size: int
+    ):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_size = max_size
+        # chat_id -> (момент устаревания по time.monotonic, ответ get_chat)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Task] = dict()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, chat_id: int):
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            expires_at, chat = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(chat_id)
+                self.hits += 1
+                return chat
+            del self._entries[chat_id]
+
+        task = self._inflight.get(chat_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(chat_id))
+            # Если все ожидающие отменены, ошибку запроса никто не заберет
+            task.add_done_callback(self._consume_exception)
+            self._inflight[chat_id] = task
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _load(self, chat_id: int):
+        try:
+            chat = await self._fetch(chat_id)
+        finally:
+            self._inflight.pop(chat_id, None)
+        self._entries[chat_id] = (time.monotonic() + self.ttl, chat)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return chat
+
+    @staticmethod
+    def _consume_exception(task: asyncio.Task):
+        if not task.cancelled():
+            task.exception()
+
+    def invalidate(self, chat_id: int):
+        """Сбрасывает запись, когда данные чата заведомо изменились."""
+        self._entries.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+
+chat_cache = ChatInfoCache(bot.get_chat, CHAT_CACHE_TTL_SECONDS, CHAT_CACHE_MAX_SIZE)
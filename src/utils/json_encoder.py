@@ -1,15 +1,42 @@
-import dataclasses
-import json
-from datetime import date, datetime
-from typing import Any
-
-
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, obj: Any) -> Any:
-        if dataclasses.is_dataclass(obj):
-            return dataclasses.asdict(obj)
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        elif isinstance(obj, date):
-            return obj.isoformat()
-        return super().default(obj)
+import dataclasses
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from typing import Any
+
+
+class EnhancedJSONEncoder(json.JSONEncoder):
+    def default(self, obj: Any) -> Any:
+        if hasattr(obj, "to_dict"):
+            return obj.to_dict()
+        elif dataclasses.is_dataclass(obj):
+            return dataclasses.asdict(obj)
+        elif isinstance(obj, datetime):
+            return obj.isoformat()
+        elif isinstance(obj, date):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def write_json_atomic(path: str, data) -> int:
+    """
+    Записывает JSON во временный файл и атомарно подменяет им целевой.
+
+    Returns:
+        int: Размер записанного файла в байтах
+    """
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, cls=EnhancedJSONEncoder, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+            written = os.fstat(f.fileno()).st_size
+        os.replace(temp_path, path)
+        return written
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
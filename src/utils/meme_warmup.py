@@ -0,0 +1,106 @@
+import asyncio
+from typing import List, Optional
+
+from aiogram.utils.exceptions import RetryAfter
+
+from config.config import (
+    MEME_WARMUP_CHAT_ID,
+    MEME_WARMUP_DELAY_SECONDS,
+    RATE_LIMIT_MAX_RETRIES,
+)
+from dispatcher import bot
+from logger import noFapLogger
+from src.database.meme_catalog import MemeCatalog
+
+# Как часто писать в лог прогресс прогрева
+PROGRESS_LOG_EVERY = 10
+
+
+async def memes_without_file_id(catalog: MemeCatalog) -> List[str]:
+    """Мемы без известного file_id, начиная с ранних дней (их выдают чаще)."""
+    return [
+        entry.filename
+        for entry in catalog.entries()
+        if await catalog.file_id(entry.filename) is None
+    ]
+
+
+async def _upload_meme(catalog: MemeCatalog, chat_id: int, meme: str):
+    attempt = 0
+    while True:
+        try:
+            with open(catalog.path(meme), "rb") as meme_pic:
+                sent = await bot.send_photo(
+                    chat_id, meme_pic, disable_notification=True
+                )
+            break
+        except RetryAfter:
+            attempt += 1
+            if attempt > RATE_LIMIT_MAX_RETRIES:
+                # Ошибку запишет в лог прогрев, он перейдет к следующему мему
+                raise
+            # Бот уже приостановил отправку, файл нужно открыть и загрузить заново
+            continue
+    catalog.set_file_id(meme, sent.photo[-1].file_id)
+    try:
+        # Сообщение нужно только ради file_id, чат не засоряем
+        await bot.delete_message(chat_id, sent.message_id)
+    except Exception as e:
+        noFapLogger.warning(f"⚠️ Failed to delete warm-up message for {meme}: {e}")
+
+
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def start_meme_warmup(catalog: MemeCatalog) -> bool:
+    """
+    Запускает прогрев в фоне, если он еще не идет.
+
+    Returns:
+        bool: True если прогрев запущен
+    """
+    global _warmup_task
+    if _warmup_task is not None and not _warmup_task.done():
+        return False
+    _warmup_task = asyncio.create_task(warm_up_meme_file_ids(catalog))
+    return True
+
+
+async def warm_up_meme_file_ids(catalog: MemeCatalog):
+    """
+    Заранее загружает в Telegram мемы без file_id, чтобы первая выдача мема
+    в checkRating не платила за загрузку файла.
+
+    Мемы загружаются по одному в служебный чат MEME_WARMUP_CHAT_ID с паузой
+    MEME_WARMUP_DELAY_SECONDS между загрузками.
+    """
+    if MEME_WARMUP_CHAT_ID is None:
+        noFapLogger.info("Meme warm-up chat is not configured, skipping warm-up")
+        return
+
+    pending = await memes_without_file_id(catalog)
+    if not pending:
+        noFapLogger.info("🔥 All memes already have file_id, nothing to warm up")
+        return
+
+    noFapLogger.info(f"🔥 Warming up file_id cache for {len(pending)} memes")
+    uploaded = 0
+    failed = 0
+    for number, meme in enumerate(pending, start=1):
+        try:
+            await _upload_meme(catalog, MEME_WARMUP_CHAT_ID, meme)
+            uploaded += 1
+        except Exception as e:
+            failed += 1
+            noFapLogger.error(f"❌ Failed to warm up meme {meme}: {e}")
+        if number % PROGRESS_LOG_EVERY == 0:
+            noFapLogger.info(f"🔥 Meme warm-up progress: {number}/{len(pending)}")
+            await catalog.flush()
+        if number < len(pending):
+            await asyncio.sleep(MEME_WARMUP_DELAY_SECONDS)
+
+    await catalog.flush()
+    noFapLogger.info(
+        f"🔥 Meme warm-up finished: {uploaded} uploaded, {failed} failed, "
+        f"{catalog.cached_file_ids()} memes cached"
+    )
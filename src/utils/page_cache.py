@@ -0,0 +1,38 @@
+from typing import Callable, Dict, Hashable
+
+
+class PageCache:
+    """
+    Кэш отрисованных страниц по номеру страницы.
+
+    Все страницы привязаны к общему ключу актуальности (например, версия данных
+    и текущая минута). При смене ключа кэш сбрасывается целиком.
+    """
+
+    def __init__(self):
+        self._pages: Dict[int, str] = dict()
+        self._key: Hashable = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, page: int, key: Hashable, render: Callable[[], str]) -> str:
+        if key != self._key:
+            self._pages.clear()
+            self._key = key
+        text = self._pages.get(page)
+        if text is not None:
+            self.hits += 1
+            return text
+        self.misses += 1
+        text = render()
+        self._pages[page] = text
+        return text
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "pages": len(self._pages),
+        }
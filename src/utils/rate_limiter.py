@@ -0,0 +1,215 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.utils.exceptions import (
+    NetworkError,
+    RestartingTelegram,
+    RetryAfter,
+    TelegramAPIError,
+)
+
+from logger import noFapLogger
+from src.utils.async_utils import AdaptiveConcurrencyLimiter
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием: токен забирается сразу, а вызывающий
+    получает время, которое нужно подождать. Очередь ждущих выражается
+    отрицательным числом токенов, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+    def reserve(self, now: float) -> float:
+        """Забирает токен и возвращает, сколько секунд ждать до отправки."""
+        self._refill(now)
+        self._tokens -= 1
+        return max(0.0, self._updated - now) + max(0.0, -self._tokens) / self.rate
+
+    def pause(self, until: float):
+        """
+        Не выдает токенов до момента until. Сделанные резервы сбрасываются:
+        ждущие должны зарезервировать токен заново.
+        """
+        self._tokens = 0
+        self._updated = max(self._updated, until)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+
+class OutboundRateLimiter:
+    """
+    Ограничение исходящих сообщений по лимитам Telegram: общий bucket на бота
+    и отдельный на каждый чат (для групп - поминутный лимит).
+    RetryAfter приостанавливает общий bucket, то есть все отправки сразу.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: float,
+        group_rate_per_minute: float,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_minute / 60
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = dict()
+        self._prune_at = 1024
+        self._paused_until = 0.0
+        self.sent = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.pauses = 0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self._prune_at:
+                self._prune(now)
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float):
+        # Полный bucket ничем не отличается от нового - его можно забыть
+        self._chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self._chat_buckets.items()
+            if not bucket.is_idle(now)
+        }
+        self._prune_at = max(1024, 2 * len(self._chat_buckets))
+
+    async def acquire(self, chat_id: Optional[int]):
+        now = time.monotonic()
+        chat_ready = now
+        if chat_id is not None:
+            chat_ready += self._chat_bucket(chat_id, now).reserve(now)
+        self.sent += 1
+        waited = False
+        while True:
+            pauses = self.pauses
+            now = time.monotonic()
+            ready = max(chat_ready, now + self.global_bucket.reserve(now))
+            if ready <= now:
+                return
+            if not waited:
+                self.throttled += 1
+                waited = True
+            self.total_wait += ready - now
+            await asyncio.sleep(ready - now)
+            # Пока ждали, Telegram попросил паузу - резерв сброшен, встаем заново
+            if self.pauses == pauses:
+                return
+
+    def pause(self, seconds: float):
+        until = time.monotonic() + seconds
+        if until <= self._paused_until:
+            return
+        self._paused_until = until
+        self.global_bucket.pause(until)
+        self.pauses += 1
+        noFapLogger.warning(
+            f"⏸️ Telegram flood control: pausing all sends for {seconds}s"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "avg_wait": self.total_wait / self.throttled if self.throttled else 0.0,
+            "pauses": self.pauses,
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            "chat_buckets": len(self._chat_buckets),
+        }
+
+
+class RateLimitedBot(Bot):
+    """
+    Bot, пропускающий все отправки и правки сообщений через OutboundRateLimiter.
+
+    Запросы без файлов при RetryAfter повторяются сами (до max_retries раз),
+    запросы с файлами пробрасывают RetryAfter наверх: файл уже прочитан, и
+    повторять загрузку должен вызывающий. Время ответа отправок без файлов и
+    перегрузки API сообщаются AdaptiveConcurrencyLimiter.
+    """
+
+    def __init__(
+        self,
+        *args,
+        limiter: OutboundRateLimiter,
+        max_retries: int,
+        concurrency: AdaptiveConcurrencyLimiter,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        limited = _is_limited_method(method)
+        chat_id = (data or {}).get("chat_id")
+        attempt = 0
+        while True:
+            if limited:
+                await self.limiter.acquire(
+                    chat_id if isinstance(chat_id, int) else None
+                )
+            started = time.monotonic()
+            try:
+                result = await super().request(method, data, files, **kwargs)
+            except RetryAfter as err:
+                self.concurrency.on_overload()
+                self.limiter.pause(err.timeout)
+                attempt += 1
+                if files or attempt > self.max_retries:
+                    raise
+                continue
+            except (TelegramAPIError, asyncio.TimeoutError) as err:
+                if _is_overload(err):
+                    self.concurrency.on_overload()
+                raise
+            # Задержку меряем только у отправки сообщений: загрузка файла долгая
+            # сама по себе, а getUpdates держит long polling по своему таймауту
+            if limited and not files:
+                self.concurrency.on_success(time.monotonic() - started)
+            return result
+
+
+# Методы, которые создают или меняют сообщения в чате и подпадают под лимиты
+# Telegram: send*, editMessage* (листание статистики) и пересылка
+LIMITED_METHOD_PREFIXES = ("send", "editMessage")
+LIMITED_METHODS = frozenset(("copyMessage", "forwardMessage"))
+
+
+def _is_limited_method(method: str) -> bool:
+    return method.startswith(LIMITED_METHOD_PREFIXES) or method in LIMITED_METHODS
+
+
+def _is_overload(err: Exception) -> bool:
+    """Ошибки, означающие, что API не справляется (5xx, сеть, таймаут)."""
+    # Ответы 5xx aiogram поднимает как "голый" TelegramAPIError
+    return type(err) is TelegramAPIError or isinstance(
+        err, (NetworkError, RestartingTelegram, asyncio.TimeoutError)
+    )
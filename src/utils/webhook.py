@@ -0,0 +1,46 @@
+import hmac
+
+from aiogram import Bot
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiohttp import web
+
+from config.config import WEBHOOK_SECRET_TOKEN, WEBHOOK_URL
+from logger import noFapLogger
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class SecretTokenRequestHandler(WebhookRequestHandler):
+    """
+    Обработчик webhook, принимающий только запросы с секретом, который бот
+    передал Telegram в setWebhook. Без настроенного секрета отклоняется все.
+    """
+
+    async def post(self):
+        if not WEBHOOK_SECRET_TOKEN or not hmac.compare_digest(
+            self.request.headers.get(SECRET_TOKEN_HEADER, ""), WEBHOOK_SECRET_TOKEN
+        ):
+            noFapLogger.warning(
+                f"🚫 Webhook request with wrong secret token from {self.request.remote}"
+            )
+            raise web.HTTPUnauthorized()
+        return await super().post()
+
+
+async def register_webhook(bot: Bot):
+    """Регистрирует WEBHOOK_URL в Telegram (или в локальном Bot API сервере)."""
+    if not WEBHOOK_SECRET_TOKEN:
+        # Без секрета любой, кто знает адрес, может слать обновления от имени админа
+        raise RuntimeError(
+            "❌ CRITICAL ERROR: WEBHOOK_SECRET_TOKEN is empty. "
+            "Cannot start in webhook mode without a secret token."
+        )
+    if not WEBHOOK_URL:
+        noFapLogger.info("🌐 WEBHOOK_URL is empty, keeping the current webhook")
+        return
+    await bot.set_webhook(
+        WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        drop_pending_updates=True,
+    )
+    noFapLogger.info(f"🌐 Webhook set to {WEBHOOK_URL}")